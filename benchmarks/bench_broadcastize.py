@@ -0,0 +1,50 @@
+#! /usr/bin/env python
+# -*- mode: python; coding: utf-8 -*-
+# Copyright 2016 Peter Williams <peter@newton.cx> and collaborators.
+# Licensed under the MIT License.
+
+"""Measure the per-call overhead of the :func:`pwkit.numutil.broadcastize`
+decorator, by timing a trivial function with and without decoration for
+various kinds of inputs. Usage::
+
+  python benchmarks/bench_broadcastize.py [NUMBER]
+
+where NUMBER is the number of calls to time for each case (default 100000).
+
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import sys, timeit
+import numpy as np
+
+from pwkit.numutil import broadcastize
+
+
+def raw (x, y):
+    return x * y + 1
+
+wrapped = broadcastize (2) (raw)
+
+
+def main ():
+    number = int (sys.argv[1]) if len (sys.argv) > 1 else 100000
+
+    cases = [
+        ('python scalars', (2., 3.)),
+        ('numpy scalars', (np.float64 (2.), np.float64 (3.))),
+        ('1-element arrays', (np.array ([2.]), np.array ([3.]))),
+        ('same-shape 100-element arrays', (np.ones (100), np.ones (100))),
+        ('broadcast (100,) with scalar', (np.ones (100), 3.)),
+        ('integer arrays', (np.arange (100), np.arange (100))),
+    ]
+
+    print ('%-32s %12s %12s %12s' % ('case', 'raw (us)', 'wrapped (us)', 'overhead'))
+
+    for desc, args in cases:
+        t_raw = timeit.timeit (lambda: raw (*args), number=number) / number * 1e6
+        t_wrap = timeit.timeit (lambda: wrapped (*args), number=number) / number * 1e6
+        print ('%-32s %12.3f %12.3f %12.3f' % (desc, t_raw, t_wrap, t_wrap - t_raw))
+
+
+if __name__ == '__main__':
+    main ()
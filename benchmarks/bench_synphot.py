@@ -0,0 +1,53 @@
+#! /usr/bin/env python
+# -*- mode: python; coding: utf-8 -*-
+# Copyright 2016 Peter Williams <peter@newton.cx> and collaborators.
+# Licensed under the MIT License.
+
+"""Compare the speed and results of the "exact" and "romberg" methods of
+:meth:`pwkit.synphot.Bandpass.synphot` on the bundled WISE and MKO bandpasses,
+using a power-law model spectrum. Usage::
+
+  python benchmarks/bench_synphot.py [NUMBER]
+
+where NUMBER is the number of calls to time for each case (default 10). The
+Romberg method is skipped if :func:`scipy.integrate.romberg` is not available.
+
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import sys, timeit
+import numpy as np
+
+from pwkit import synphot
+
+
+def main ():
+    number = int (sys.argv[1]) if len (sys.argv) > 1 else 10
+
+    try:
+        from scipy.integrate import romberg
+    except ImportError:
+        methods = ['exact']
+    else:
+        methods = ['exact', 'romberg']
+
+    reg = synphot.get_std_registry ()
+    wlen = np.logspace (3, 6, 3000) # 0.1 to 100 μm
+    flam = wlen**-2
+
+    print ('%-12s %-8s %12s %20s' % ('bandpass', 'method', 'time (ms)', 'result'))
+
+    for telescope, band in [('WISE', 1), ('WISE', 2), ('WISE', 3), ('WISE', 4),
+                            ('MKO', 'Ks'), ('MKO', 'Lp'), ('MKO', 'Mp')]:
+        bp = reg.get (telescope, band)
+        bp._ensure_data ()
+        desc = '%s/%s' % (telescope, band)
+
+        for method in methods:
+            f = lambda: bp.synphot (wlen, flam, method=method)
+            t = timeit.timeit (f, number=number) / number * 1e3
+            print ('%-12s %-8s %12.3f %20.12g' % (desc, method, t, f ()))
+
+
+if __name__ == '__main__':
+    main ()
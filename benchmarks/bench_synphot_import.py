@@ -0,0 +1,55 @@
+#! /usr/bin/env python
+# -*- mode: python; coding: utf-8 -*-
+# Copyright 2016 Peter Williams <peter@newton.cx> and collaborators.
+# Licensed under the MIT License.
+
+"""Measure the cost of importing :mod:`pwkit.synphot`, and of then
+converting a magnitude in a single band, in fresh Python processes. Usage::
+
+  python benchmarks/bench_synphot_import.py [NUMBER]
+
+where NUMBER is the number of processes to time for each case (default 10).
+The time needed to start Python and import :mod:`pwkit` itself is measured
+separately and subtracted.
+
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import subprocess, sys, time
+
+
+cases = [
+    ('import pwkit.synphot', 'import pwkit.synphot'),
+    ('get_std_registry ()', 'import pwkit.synphot as s; s.get_std_registry ()'),
+    ('one 2MASS mag_to_flam', 'import pwkit.synphot as s; '
+     's.get_std_registry ().get ("2MASS", "Ks").mag_to_flam (10.)'),
+]
+
+
+def best_time (code, number):
+    best = None
+
+    for _ in range (number):
+        t0 = time.time ()
+        subprocess.check_call ([sys.executable, '-c', code])
+        elapsed = time.time () - t0
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best
+
+
+def main ():
+    number = int (sys.argv[1]) if len (sys.argv) > 1 else 10
+    baseline = best_time ('import pwkit', number)
+
+    print ('%-24s %12s' % ('case', 'time (ms)'))
+    print ('%-24s %12.1f' % ('(baseline: import pwkit)', baseline * 1e3))
+
+    for desc, code in cases:
+        print ('%-24s %12.1f' % (desc, (best_time (code, number) - baseline) * 1e3))
+
+
+if __name__ == '__main__':
+    main ()
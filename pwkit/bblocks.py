@@ -22,10 +22,15 @@ Functions are:
   Like :func:`tt_bblock` with bootstrap-based uncertainty assessment. NOTE:
   the uncertainties are not very reliable!
 
+Classes are:
+
+:class:`StreamingBBlocks`
+  Incremental BB analysis of a live stream of time-tagged events.
+
 """
 from __future__ import absolute_import, division, print_function, unicode_literals
 
-__all__ = str ('nlogn bin_bblock tt_bblock bs_tt_bblock').split ()
+__all__ = str ('nlogn bin_bblock tt_bblock bs_tt_bblock StreamingBBlocks').split ()
 
 
 from six.moves import range
@@ -49,12 +54,78 @@ def nlogn (n, dt):
     return np.where (mask, 0, r)
 
 
-def bin_bblock (widths, counts, p0=0.05):
+def _bblock_dp_full (block_remainders, count_remainders, ncp_prior, best, last):
+    """The O(N^2) Bayesian Blocks dynamic program, filling in *best* and *last*
+    in-place.
+
+    """
+    for r in range (best.size):
+        tk = block_remainders[:r+1] - block_remainders[r+1]
+        nk = count_remainders[:r+1] - count_remainders[r+1]
+
+        # Pluggable fitness expression:
+        fit_vec = nlogn (nk, tk)
+
+        # This incrementally penalizes partitions with more blocks:
+        tmp = fit_vec - ncp_prior
+        tmp[1:] += best[:r]
+
+        imax = np.argmax (tmp)
+        last[r] = imax
+        best[r] = tmp[imax]
+
+
+def _bblock_dp_pelt (block_remainders, count_remainders, ncp_prior, best, last,
+                     start=0, cands=None, bestpad=None):
+    """The Bayesian Blocks dynamic program with "PELT" pruning (Killick+ 2012),
+    filling in *best* and *last* in-place, starting at cell *start*. Returns
+    the array of surviving change-point candidates. If *bestpad* is given, it
+    must be an array such that ``best`` is ``bestpad[1:]`` and ``bestpad[0]``
+    is zero; this saves a copy when the program is extended incrementally.
+
+    The fitness function is superadditive -- merging two blocks never
+    increases the total fitness -- so a candidate block start *s* whose best
+    possible fitness at cell *r*, not counting the block penalty, is already
+    worse than best[r] can never be optimal for any later cell and may be
+    dropped. The results are identical to the unpruned algorithm, but the
+    number of candidates stays small in practice, making the cost close to
+    linear in the number of cells.
+
+    """
+    # bestpad[s] is the best fitness of the cells before cell s.
+    if bestpad is None:
+        bestpad = np.concatenate (([0.], best))
+
+    if cands is None:
+        cands = np.empty (0, dtype=int)
+
+    log, maximum, argmax = np.log, np.maximum, np.argmax # avoid lookups in the loop
+
+    for r in range (start, best.size):
+        cands = np.append (cands, r)
+        tk = block_remainders[cands] - block_remainders[r+1]
+        nk = count_remainders[cands] - count_remainders[r+1]
+
+        # This is nlogn (nk, tk) without the function-call overhead:
+        tmp = nk * (log (maximum (nk, 1)) - log (tk)) - ncp_prior + bestpad[cands]
+
+        imax = argmax (tmp)
+        last[r] = cands[imax]
+        best[r] = bestpad[r+1] = tmp[imax]
+        cands = cands[tmp + ncp_prior >= best[r]]
+
+    return cands
+
+
+def bin_bblock (widths, counts, p0=0.05, method='pelt'):
     """Fundamental Bayesian Blocks algorithm. Arguments:
 
     widths  - Array of consecutive cell widths.
     counts  - Array of numbers of counts in each cell.
     p0=0.05 - Probability of preferring solutions with additional bins.
+    method='pelt' - Either 'pelt', to use the pruned dynamic program that
+                  runs in close to linear time, or 'full', to use the original
+                  quadratic-time algorithm. The results are the same.
 
     Returns a Holder with:
 
@@ -79,6 +150,8 @@ def bin_bblock (widths, counts, p0=0.05):
         raise ValueError ('widths and counts must have same size')
     if p0 < 0 or p0 >= 1.:
         raise ValueError ('p0 must lie within [0, 1)')
+    if method not in ('pelt', 'full'):
+        raise ValueError ('unrecognized method %r' % (method,))
 
     vedges = np.cumsum (np.concatenate (([0], widths))) # size: ncells + 1
     block_remainders = vedges[-1] - vedges # size: nedges = ncells + 1
@@ -93,20 +166,10 @@ def bin_bblock (widths, counts, p0=0.05):
         # Pluggable num-change-points prior-weight expression:
         ncp_prior = 4 - np.log (p0 / (0.0136 * ncells**0.478))
 
-        for r in range (ncells):
-            tk = block_remainders[:r+1] - block_remainders[r+1]
-            nk = count_remainders[:r+1] - count_remainders[r+1]
-
-            # Pluggable fitness expression:
-            fit_vec = nlogn (nk, tk)
-
-            # This incrementally penalizes partitions with more blocks:
-            tmp = fit_vec - ncp_prior
-            tmp[1:] += best[:r]
-
-            imax = np.argmax (tmp)
-            last[r] = imax
-            best[r] = tmp[imax]
+        if method == 'pelt':
+            _bblock_dp_pelt (block_remainders, count_remainders, ncp_prior, best, last)
+        else:
+            _bblock_dp_full (block_remainders, count_remainders, ncp_prior, best, last)
 
         # different semantics than Scargle impl: our blockstarts is similar to
         # their changepoints, but we always finish with blockstarts[0] = 0.
@@ -213,56 +276,58 @@ def tt_bblock (tstarts, tstops, times, p0=0.05):
         raise ValueError ('no times may be smaller than first tstart')
     if times.max () > tstops[-1]:
         raise ValueError ('no times may be larger than last tstop')
-    for i in range (1, ngti):
-        if np.where ((times > tstops[i-1]) & (times < tstarts[i]))[0].size:
-            raise ValueError ('no times may fall in goodtime gap #%d' % i)
+    # Index of the GTI that each event falls in, if it's not in a gap: the
+    # first one whose stop time is not before the event.
+    gtiidx = np.searchsorted (tstops, times, 'left')
+    ingap = times < tstarts[gtiidx]
+    if np.any (ingap):
+        raise ValueError ('no times may fall in goodtime gap #%d' % gtiidx[ingap].min ())
     if p0 < 0 or p0 >= 1.:
         raise ValueError ('p0 must lie within [0, 1)')
 
     utimes, uidxs = np.unique (times, return_index=True)
     nunique = utimes.size
 
-    counts = np.empty (nunique)
-    counts[:-1] = uidxs[1:] - uidxs[:-1]
-    counts[-1] = times.size - uidxs[-1]
-    assert counts.sum () == times.size
-
-    # we grow these arrays with concats, which will perform badly with lots of
-    # GTIs. Not expected to be a big deal.
-    widths = np.empty (0)
-    ledges = np.empty (0)
-    redges = np.empty (0)
-
-    for i in range (ngti):
-        tstart, tstop = tstarts[i], tstops[i]
-
-        w = np.where ((utimes >= tstart) & (utimes <= tstop))[0]
-
-        if not w.size:
-            # No events during this goodtime! We have to insert a zero-count
-            # event block. This may break assumptions within bin_bblock()?
-
-            # j = idx of first event after this GTI
-            wafter = np.where (utimes > tstop)[0]
-            if wafter.size:
-                j = wafter[0]
-            else:
-                j = utimes.size
-            assert j == 0 or np.where (utimes < tstart)[0][-1] == j - 1
-
-            counts = np.concatenate ((counts[:j], [0], counts[j:]))
-            widths = np.concatenate ((widths, [tstop - tstart]))
-            ledges = np.concatenate ((ledges, [tstart]))
-            redges = np.concatenate ((redges, [tstop]))
-        else:
-            gtutimes = utimes[w]
-            midpoints = 0.5 * (gtutimes[1:] + gtutimes[:-1]) # size: n - 1
-            gtedges = np.concatenate (([tstart], midpoints, [tstop])) # size: n + 1
-            gtwidths = gtedges[1:] - gtedges[:-1] # size: n
-            assert gtwidths.sum () == tstop - tstart
-            widths = np.concatenate ((widths, gtwidths))
-            ledges = np.concatenate ((ledges, gtedges[:-1]))
-            redges = np.concatenate ((redges, gtedges[1:]))
+    ucounts = np.empty (nunique)
+    ucounts[:-1] = uidxs[1:] - uidxs[:-1]
+    ucounts[-1] = times.size - uidxs[-1]
+    assert ucounts.sum () == times.size
+
+    # Each unique event time gets a cell whose edges are the midpoints between
+    # it and its neighbors, or the GTI boundaries. Each GTI without any
+    # events gets a single zero-count cell spanning it. We compute where all
+    # of these cells go in one pass.
+
+    ugti = gtiidx[uidxs]
+    nper = np.bincount (ugti, minlength=ngti)
+    empty = (nper == 0)
+    nempty_before = np.cumsum (empty) - empty
+    nevents_before = np.cumsum (nper) - nper
+
+    ncells = nunique + empty.sum ()
+    counts = np.zeros (ncells)
+    ledges = np.empty (ncells)
+    redges = np.empty (ncells)
+
+    mid = 0.5 * (utimes[1:] + utimes[:-1])
+    first = np.ones (nunique, dtype=bool)
+    first[1:] = (ugti[1:] != ugti[:-1])
+    last = np.ones (nunique, dtype=bool)
+    last[:-1] = first[1:]
+
+    epos = np.arange (nunique) + nempty_before[ugti]
+    counts[epos] = ucounts
+    ledges[epos[1:]] = mid
+    ledges[epos[first]] = tstarts[ugti[first]]
+    redges[epos[:-1]] = mid
+    redges[epos[last]] = tstops[ugti[last]]
+
+    eidx = np.flatnonzero (empty)
+    epos = nevents_before[eidx] + nempty_before[eidx]
+    ledges[epos] = tstarts[eidx]
+    redges[epos] = tstops[eidx]
+
+    widths = redges - ledges
 
     assert counts.size == widths.size
     info = bin_bblock (widths, counts, p0=p0)
@@ -274,7 +339,32 @@ def tt_bblock (tstarts, tstops, times, p0=0.05):
     return info
 
 
-def bs_tt_bblock (times, tstarts, tstops, p0=0.05, nbootstrap=512):
+def _map_bootstrap_batch (args):
+    """Run a batch of bootstrap resamplings for :func:`bs_tt_bblock`, returning
+    the sums and sums of squares of the sampled rates. Each batch has its own
+    random number generator so that batches can be computed in parallel.
+
+    """
+    times, tstarts, tstops, p0, midpoints, seed, n = args
+    rng = np.random.RandomState (seed)
+    rsums = np.zeros (midpoints.size)
+    rsumsqs = np.zeros (midpoints.size)
+
+    for _ in range (n):
+        bstimes = times[rng.randint (0, times.size, times.size)]
+        bstimes.sort ()
+        bsinfo = tt_bblock (tstarts, tstops, bstimes, p0)
+        blocknums = np.minimum (np.searchsorted (bsinfo.redges, midpoints),
+                                bsinfo.nblocks - 1)
+        samprates = bsinfo.rates[blocknums]
+        rsums += samprates
+        rsumsqs += samprates**2
+
+    return rsums, rsumsqs
+
+
+def bs_tt_bblock (times, tstarts, tstops, p0=0.05, nbootstrap=512, bs_batch=16,
+                  parallel=True):
     """Bayesian Blocks for time-tagged events with bootstrapping uncertainty
     assessment. THE UNCERTAINTIES ARE NOT VERY GOOD! Arguments:
 
@@ -283,6 +373,9 @@ def bs_tt_bblock (times, tstarts, tstops, p0=0.05, nbootstrap=512):
     times          - Array of event arrival times.
     p0=0.05        - Probability of preferring solutions with additional bins.
     nbootstrap=512 - Number of bootstrap runs to perform.
+    bs_batch=16    - Number of bootstrap runs performed by each parallel task.
+    parallel=True  - Controls parallelization of the bootstrap runs; see
+                     `pwkit.parallel.make_parallel_helper`.
 
     Returns a Holder with:
 
@@ -300,32 +393,44 @@ def bs_tt_bblock (times, tstarts, tstops, p0=0.05, nbootstrap=512):
     redges      - Times of right edges of output blocks.
     widths      - Width of each output block.
 
+    Each batch of bootstrap runs uses its own random number generator, seeded
+    from :func:`numpy.random.randint`, so the results do not depend on how
+    the work is parallelized.
+
     """
+    from .parallel import make_parallel_helper
+
     times = np.asarray (times)
     tstarts = np.asarray (tstarts)
     tstops = np.asarray (tstops)
+    bs_batch = int (bs_batch)
 
     nevents = times.size
     if nevents < 1:
         raise ValueError ('must be given at least 1 event')
+    if bs_batch < 1:
+        raise ValueError ('bs_batch must be at least 1')
 
     info = tt_bblock (tstarts, tstops, times, p0)
 
     # Now bootstrap resample to assess uncertainties on the bin heights. This
     # is the approach recommended by Scargle+.
 
+    sizes = [min (bs_batch, nbootstrap - i) for i in range (0, nbootstrap, bs_batch)]
+    seeds = np.random.randint (0, 2**31 - 1, size=len (sizes))
+    phelp = make_parallel_helper (parallel)
+
+    with phelp.get_map () as map:
+        results = list (map (_map_bootstrap_batch,
+                             [(times, tstarts, tstops, p0, info.midpoints, seed, n)
+                              for seed, n in zip (seeds, sizes)]))
+
     bsrsums = np.zeros (info.nblocks)
     bsrsumsqs = np.zeros (info.nblocks)
 
-    for _ in range (nbootstrap):
-        bstimes = times[np.random.randint (0, times.size, times.size)]
-        bstimes.sort ()
-        bsinfo = tt_bblock (tstarts, tstops, bstimes, p0)
-        blocknums = np.minimum (np.searchsorted (bsinfo.redges, info.midpoints),
-                                bsinfo.nblocks - 1)
-        samprates = bsinfo.rates[blocknums]
-        bsrsums += samprates
-        bsrsumsqs += samprates**2
+    for rsums, rsumsqs in results:
+        bsrsums += rsums
+        bsrsumsqs += rsumsqs
 
     bsrmeans = bsrsums / nbootstrap
     mask = bsrsumsqs / nbootstrap <= bsrmeans**2
@@ -333,3 +438,294 @@ def bs_tt_bblock (times, tstarts, tstops, p0=0.05, nbootstrap=512):
     info.bsrates = bsrmeans
     info.bsrstds = bsrstds
     return info
+
+
+class StreamingBBlocks (object):
+    """Incremental Bayesian Blocks analysis of a live stream of time-tagged
+    events. Constructor arguments:
+
+    tstart=None      - Start time of the first goodtime interval (GTI), if it
+                       is known yet.
+    p0=0.05          - Probability of preferring solutions with additional bins.
+    nexpected=1000   - Expected total number of cells; see below.
+    ncp_prior=None   - If not None, the block penalty to use, overriding `p0`
+                       and `nexpected`.
+
+    Events and GTI boundaries are fed in with :meth:`add_events`,
+    :meth:`end_gti`, and :meth:`begin_gti`, or all at once with
+    :meth:`update`. The dynamic-programming state of the analysis is kept
+    between updates and only extended, so the cost of each update is roughly
+    proportional to the amount of new data. The current partition is obtained
+    with :meth:`blocks`.
+
+    The cells are the same as in :func:`tt_bblock`, so that after all of the
+    data have been fed in, the results are those of :func:`bin_bblock` for a
+    fixed block penalty. Unlike :func:`bin_bblock`, there is no iterative
+    refinement of `p0`, since that would require revisiting the entire
+    history. The penalty is computed from `p0` with the same expression, in
+    which `nexpected` stands in for the total number of cells.
+
+    Attributes:
+
+    ncp_prior - The block penalty in use.
+    nevents   - The number of events received so far.
+    p0        - The value of `p0`.
+
+    """
+    def __init__ (self, tstart=None, p0=0.05, nexpected=1000, ncp_prior=None):
+        if ncp_prior is None:
+            if p0 <= 0 or p0 >= 1.:
+                raise ValueError ('p0 must lie within (0, 1)')
+            if nexpected < 1:
+                raise ValueError ('nexpected must be at least 1')
+            ncp_prior = 4 - np.log (p0 / (0.0136 * nexpected**0.478))
+
+        self.p0 = p0
+        self.ncp_prior = float (ncp_prior)
+        self.nevents = 0
+
+        # The finalized cells. We store cumulative sums of the cell widths
+        # and counts, negated so that differences come out the same way as
+        # the "remainders" used by the batch algorithm; unlike remainders,
+        # these don't change as new cells are appended.
+        self._n = 0
+        self._negedges = np.zeros (1)
+        self._negcounts = np.zeros (1)
+        self._bestpad = np.zeros (1)
+        self._last = np.zeros (0, dtype=int)
+        self._ledges = np.zeros (0)
+        self._redges = np.zeros (0)
+        self._cands = np.empty (0, dtype=int)
+
+        # The GTI state. The cell of the most recent event is pending, since
+        # its right edge depends on the next event.
+        self._gti_start = None
+        self._last_stop = None
+        self._pending_time = None
+        self._pending_count = 0
+        self._pending_ledge = None
+
+        if tstart is not None:
+            self.begin_gti (tstart)
+
+
+    def _reserve (self, n):
+        """Make sure that there is room to store *n* cells."""
+        cap = self._last.size
+        if n <= cap:
+            return
+
+        cap = max (2 * cap, n, 64)
+
+        def grow (a, size):
+            b = np.zeros (size, dtype=a.dtype)
+            b[:a.size] = a
+            return b
+
+        self._negedges = grow (self._negedges, cap + 1)
+        self._negcounts = grow (self._negcounts, cap + 1)
+        self._bestpad = grow (self._bestpad, cap + 1)
+        self._last = grow (self._last, cap)
+        self._ledges = grow (self._ledges, cap)
+        self._redges = grow (self._redges, cap)
+
+
+    def _extend (self, ledges, redges, counts):
+        """Store new cells following the finalized ones and run the dynamic
+        program over them. Returns the new number of cells and the surviving
+        change-point candidates, but does not mark the cells as finalized.
+
+        """
+        n0 = self._n
+        n = n0 + ledges.size
+        self._reserve (n)
+
+        self._ledges[n0:n] = ledges
+        self._redges[n0:n] = redges
+        self._negedges[n0+1:n+1] = self._negedges[n0] - np.cumsum (redges - ledges)
+        self._negcounts[n0+1:n+1] = self._negcounts[n0] - np.cumsum (counts)
+
+        cands = _bblock_dp_pelt (self._negedges[:n+1], self._negcounts[:n+1],
+                                 self.ncp_prior, self._bestpad[1:n+1], self._last[:n],
+                                 start=n0, cands=self._cands,
+                                 bestpad=self._bestpad[:n+1])
+        return n, cands
+
+
+    def _finalize (self, ledges, redges, counts):
+        if ledges.size:
+            self._n, self._cands = self._extend (ledges, redges, counts)
+
+
+    def begin_gti (self, tstart):
+        """Start a new goodtime interval at time *tstart*. Returns *self*."""
+        if self._gti_start is not None:
+            raise ValueError ('cannot begin a goodtime interval while one is open')
+        if self._last_stop is not None and tstart < self._last_stop:
+            raise ValueError ('goodtime intervals must be ordered and not overlap')
+
+        self._gti_start = float (tstart)
+        return self
+
+
+    def add_events (self, times):
+        """Add events that arrived during the current goodtime interval.
+        *times* must be sorted, and no earlier than any events added
+        previously. Returns *self*.
+
+        """
+        times = np.atleast_1d (np.asarray (times, dtype=float))
+        if times.ndim != 1:
+            raise ValueError ('times must be <= 1D')
+        if not times.size:
+            return self
+        if self._gti_start is None:
+            raise ValueError ('cannot add events without an open goodtime interval')
+        if np.any ((times[1:] - times[:-1]) < 0):
+            raise ValueError ('times must be ordered')
+        if times[0] < self._gti_start:
+            raise ValueError ('no times may be smaller than the goodtime start')
+        if self._pending_time is not None and times[0] < self._pending_time:
+            raise ValueError ('times must come after those already added')
+
+        utimes, uidxs = np.unique (times, return_index=True)
+        ucounts = np.empty (utimes.size)
+        ucounts[:-1] = uidxs[1:] - uidxs[:-1]
+        ucounts[-1] = times.size - uidxs[-1]
+        self.nevents += times.size
+
+        if self._pending_time is None:
+            ledge = self._gti_start
+        else:
+            ledge = self._pending_ledge
+            utimes = np.concatenate (([self._pending_time], utimes))
+            ucounts = np.concatenate (([self._pending_count], ucounts))
+
+            if utimes[1] == utimes[0]:
+                ucounts[1] += ucounts[0]
+                utimes = utimes[1:]
+                ucounts = ucounts[1:]
+
+        # Every cell but the last now has a known right edge.
+        ledges = np.empty (utimes.size)
+        ledges[0] = ledge
+        ledges[1:] = 0.5 * (utimes[1:] + utimes[:-1])
+        self._finalize (ledges[:-1], ledges[1:], ucounts[:-1])
+
+        self._pending_time = utimes[-1]
+        self._pending_count = ucounts[-1]
+        self._pending_ledge = ledges[-1]
+        return self
+
+
+    def end_gti (self, tstop):
+        """End the current goodtime interval at time *tstop*. Returns *self*."""
+        if self._gti_start is None:
+            raise ValueError ('no goodtime interval is open')
+        if tstop <= self._gti_start:
+            raise ValueError ('goodtime start must come before its stop')
+        if self._pending_time is not None and tstop < self._pending_time:
+            raise ValueError ('no times may be larger than the goodtime stop')
+
+        if self._pending_time is None:
+            # No events in this GTI: it gets a zero-count cell.
+            cell = (self._gti_start, tstop, 0.)
+        else:
+            cell = (self._pending_ledge, tstop, self._pending_count)
+
+        self._finalize (*[np.array ([v], dtype=float) for v in cell])
+        self._gti_start = None
+        self._last_stop = float (tstop)
+        self._pending_time = None
+        self._pending_count = 0
+        self._pending_ledge = None
+        return self
+
+
+    def update (self, times=(), tstop=None, tstart=None):
+        """Feed in a batch of data: add the events *times* to the current
+        goodtime interval; then, if *tstop* is not None, end the interval at
+        that time; then, if *tstart* is not None, begin a new interval at that
+        time. Returns *self*.
+
+        """
+        self.add_events (times)
+        if tstop is not None:
+            self.end_gti (tstop)
+        if tstart is not None:
+            self.begin_gti (tstart)
+        return self
+
+
+    def blocks (self, tnow=None):
+        """Compute the current optimal partition. If a goodtime interval is
+        open, it is treated as ending at *tnow*, which defaults to the time of
+        the most recent event. (If that leaves the most recent event with a
+        zero-width cell, it is omitted.) The stored state is not changed.
+
+        Returns a Holder with:
+
+        blockstarts - Start times of output blocks.
+        counts      - Number of events in each output block.
+        finalp0     - The value of `p0`.
+        ledges      - Times of left edges of output blocks.
+        midpoints   - Times of midpoints of output blocks.
+        nblocks     - Number of output blocks.
+        ncells      - Number of input cells/bins.
+        ncp_prior   - The block penalty.
+        origp0      - The value of `p0`.
+        rates       - Event rate associated with each block.
+        redges      - Times of right edges of output blocks.
+        widths      - Width of each output block.
+
+        """
+        n = self._n
+
+        if self._gti_start is not None:
+            if self._pending_time is not None:
+                if tnow is None:
+                    tnow = self._pending_time
+                elif tnow < self._pending_time:
+                    raise ValueError ('tnow may not be earlier than the latest event')
+
+                # If the only event so far came right at the start of the
+                # GTI, its cell may have zero width. In that case we have to
+                # leave it out.
+                if tnow > self._pending_ledge:
+                    n, _ = self._extend (np.array ([self._pending_ledge]),
+                                         np.array ([tnow], dtype=float),
+                                         np.array ([self._pending_count]))
+            elif tnow is not None:
+                if tnow < self._gti_start:
+                    raise ValueError ('tnow may not be earlier than the goodtime start')
+                if tnow > self._gti_start:
+                    n, _ = self._extend (np.array ([self._gti_start]),
+                                         np.array ([tnow], dtype=float),
+                                         np.zeros (1))
+
+        if n == 0:
+            raise ValueError ('no cells have been defined yet')
+
+        bstarts = []
+        ind = n
+        while ind > 0:
+            ind = self._last[ind - 1]
+            bstarts.append (ind)
+
+        blockstarts = np.array (bstarts[::-1], dtype=int)
+        blockstops = np.concatenate ((blockstarts[1:], [n]))
+
+        info = Holder ()
+        info.ncells = n
+        info.nblocks = blockstarts.size
+        info.origp0 = info.finalp0 = self.p0
+        info.ncp_prior = self.ncp_prior
+        info.blockstarts = blockstarts
+        info.counts = np.round (self._negcounts[blockstarts] -
+                                self._negcounts[blockstops]).astype (int)
+        info.widths = self._negedges[blockstarts] - self._negedges[blockstops]
+        info.rates = info.counts / info.widths
+        info.ledges = self._ledges[blockstarts]
+        info.redges = self._redges[blockstops - 1]
+        info.midpoints = 0.5 * (info.ledges + info.redges)
+        return info
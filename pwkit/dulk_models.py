@@ -194,6 +194,46 @@ def calc_gs_nu_pk (b, ne, delta, sinth, depth):
             b**(0.68 + 0.03 * delta))
 
 
+# Natural logarithms of the constants in the fitting functions above, for
+# _calc_gs_eta_kappa.
+_ln_nu_b_per_gauss = np.log (cgs.e / (2 * cgs.pi * cgs.me * cgs.c))
+_ln_eta_coeff = np.log (3.3e-24)
+_ln_kappa_coeff = np.log (1.4e-9)
+_ln10 = np.log (10)
+
+
+def _calc_gs_eta_kappa (b, ne, delta, sinth, nu):
+    """Calculate both the gyrosynchrotron emission and absorption coefficients,
+    as returned by :func:`calc_gs_eta` and :func:`calc_gs_kappa`.
+
+    The fitting functions are products of power laws, so we evaluate them as
+    exponentials of sums of logarithms, sharing the logarithms between the two
+    coefficients. This needs two calls to :func:`numpy.exp` instead of a
+    dozen exponentiations, which adds up when the model is evaluated inside a
+    fitting loop. The results agree with the direct forms to a relative
+    precision of about 1e-11 or better.
+
+    Both coefficients are proportional to `ne`, so we multiply by it directly
+    rather than taking its logarithm. That way nonpositive densities, which
+    unconstrained fits may try, give the same values as the direct forms
+    rather than NaNs.
+
+    """
+    lnb = np.log (b)
+    lnsinth = np.log (sinth)
+    lns = np.log (nu) - _ln_nu_b_per_gauss - lnb
+
+    lneta = (lnb + _ln_eta_coeff -
+             0.52 * _ln10 * delta +
+             (-0.43 + 0.65 * delta) * lnsinth +
+             (1.22 - 0.90 * delta) * lns)
+    lnkappa = (_ln_kappa_coeff - lnb -
+               0.22 * _ln10 * delta +
+               (-0.09 + 0.72 * delta) * lnsinth +
+               (-1.30 - 0.98 * delta) * lns)
+    return ne * np.exp (lneta), ne * np.exp (lnkappa)
+
+
 def calc_gs_snu_ujy (b, ne, delta, sinth, width, elongation, dist, ghz):
     """Calculate a flux density from pure gyrosynchrotron emission.
 
@@ -228,8 +268,7 @@ def calc_gs_snu_ujy (b, ne, delta, sinth, width, elongation, dist, ghz):
 
     """
     hz = ghz * 1e9
-    eta = calc_gs_eta (b, ne, delta, sinth, hz)
-    kappa = calc_gs_kappa (b, ne, delta, sinth, hz)
+    eta, kappa = _calc_gs_eta_kappa (b, ne, delta, sinth, hz)
     snu = calc_snu (eta, kappa, width, elongation, dist)
     ujy = snu * cgs.jypercgs * 1e6
     return ujy
@@ -238,8 +277,7 @@ def calc_gs_snu_ujy (b, ne, delta, sinth, width, elongation, dist, ghz):
 def calc_gsff_snu_ujy (b, ne_energetic, delta, sinth, ne_thermal, t, width, elongation, dist, ghz):
     hz = ghz * 1e9
 
-    gs_eta = calc_gs_eta (b, ne_energetic, delta, sinth, hz)
-    gs_kappa = calc_gs_kappa (b, ne_energetic, delta, sinth, hz)
+    gs_eta, gs_kappa = _calc_gs_eta_kappa (b, ne_energetic, delta, sinth, hz)
 
     ff_kappa = calc_freefree_kappa (ne_thermal, t, hz)
     ff_eta = calc_freefree_eta (ne_thermal, t, hz)
@@ -9,8 +9,13 @@ in a background using the approach described in Kraft, Burrows, & Nousek
 (1991). That paper provides tables of values; this module can calculate
 intervals for arbitrary inputs. Requires `scipy`.
 
-This implementation almost directly transcribes the equations. We do, however,
-work in log-gamma space to try to avoid overflows with large values of N or B.
+The posterior distribution of the source rate is a shifted gamma
+distribution, so its integrals are given by regularized incomplete gamma
+functions, and points of equal probability density are related by the Lambert
+W function. The interval is therefore found by a one-dimensional root solve: a
+Newton iteration on the logarithm of the probability outside the interval,
+falling back to bisection whenever a step would leave the bracket on the
+root. This is done on whole arrays of inputs at once.
 
 Functions:
 
@@ -24,29 +29,140 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 __all__ = str ('kbn_conf vec_kbn_conf').split ()
 
-from six.moves import range
-from numpy import exp, log, vectorize
-from scipy.special import gammaln
-from scipy.integrate import quad
-from scipy.optimize import newton
+import numpy as np
+from scipy.special import gammaincc, gammainccinv, gammaln, lambertw, ndtri
 
 
-def _cconst (N, B):
-    s = 0.
-    lnb = log (B)
+def _upper_for_lower (N, x1):
+    """Given lower values `x1` of the total (source plus background) rate,
+    between 0 and the mode `N`, return the upper values `x2` at which the
+    posterior density is the same. The density is proportional to ``x**N *
+    exp(-x)``; equating it at `x1` and `x2` gives `x2` in terms of the lower
+    branch of the Lambert W function.
+
+    """
+    t = x1 / N
+    with np.errstate (divide='ignore', invalid='ignore'):
+        x2 = -N * lambertw (-t * np.exp (-t), -1).real
+    x2[t == 0] = np.inf
+    x2[t == 1] = N[t == 1]
+    return x2
 
-    for n in range (N + 1):
-        s += exp (-B + n * lnb - gammaln (n + 1))
 
-    return 1. / s
+def vec_kbn_conf (N, B, CL, rtol=1e-12, maxiter=100):
+    """Vectorized form of `kbn_conf`.
 
+    All three inputs must be broadcastable to a common shape. Returns
+    ``(Smin, Smax)``, two arrays of that shape. Intervals that do not extend
+    to zero are found by a safeguarded Newton iteration, which stops when the
+    lower bounds of the total rate have converged to a relative tolerance of
+    *rtol*; a :exc:`RuntimeError` is raised if that takes more than
+    *maxiter* steps.
 
-def _fcnb (C, N, B, S):
-    return C * exp (-(S + B) + N * log (S + B) - gammaln (N + 1))
+    If the background is so much larger than the number of counts that the
+    probability of observing no more than `N` counts underflows (roughly,
+    ``B - N > 700``), the interval cannot be computed and NaNs are returned.
+
+    """
+    N = np.asarray (N, dtype=float)
+    if np.any (N != np.floor (N)) or np.any (N < 0):
+        raise ValueError ('N must be a nonnegative integer')
 
+    CL = np.asarray (CL, dtype=float)
+    if np.any (CL <= 0.) or np.any (CL >= 1.):
+        raise ValueError ('CL must be between 0 and 1, noninclusive')
+
+    B = np.asarray (B, dtype=float)
+    if np.any (B < 0):
+        raise ValueError ('B must be nonnegative')
 
-def _fnb (N, B, S):
-    return _fcnb (_cconst (N, B), N, B, S)
+    shape = np.broadcast (N, B, CL).shape
+    N, B, CL = [a.ravel () for a in np.broadcast_arrays (N, B, CL)]
+
+    # Work in terms of the total rate x = S + B. The normalized posterior
+    # density is x**N exp(-x) / (N! Q(N+1, B)), where Q is the regularized
+    # upper incomplete gamma function, so the probability between x1 and x2
+    # is (Q(N+1, x1) - Q(N+1, x2)) / Q(N+1, B). We need to find the smallest
+    # interval containing a fraction CL of the probability, which has equal
+    # densities at its endpoints unless it is truncated at S = 0.
+
+    a = N + 1
+    qb = gammaincc (a, B)
+    need = CL * qb
+    smin = np.zeros (N.shape)
+    smax = np.empty (N.shape)
+
+    # If the mode is above B, see whether the equal-density interval that
+    # starts at S = 0 contains more probability than we need; if so, the
+    # interval doesn't reach zero. (Note that the density vanishes at x = 0
+    # for positive N, so an interval starting at B = 0 always qualifies.)
+
+    twosided = (N > B)
+    Nt = N[twosided]
+    Bt = B[twosided]
+    at = a[twosided]
+    needt = need[twosided]
+    twosided[twosided] = (qb[twosided] - gammaincc (at, _upper_for_lower (Nt, Bt)) >= needt)
+
+    # One-sided intervals: Q(N+1, x2) = (1 - CL) Q(N+1, B).
+
+    onesided = ~twosided
+    smax[onesided] = (gammainccinv (a[onesided], (1 - CL[onesided]) * qb[onesided]) -
+                      B[onesided])
+
+    # Two-sided intervals: solve for x1 between B and the mode such that the
+    # probability in the tails outside of [x1, x2] is T = (1 - CL) Q(N+1, B).
+    # T increases monotonically with x1, so we can keep a bracket on the root
+    # and fall back to bisection whenever a Newton step would leave it. Since
+    # the densities at x1 and x2 are equal, dT/dx1 = density(x1) * (1 -
+    # dx2/dx1), and differentiating the equal-density condition gives dx2/dx1
+    # = (N/x1 - 1) / (N/x2 - 1). The tail probabilities vary roughly
+    # exponentially with x1, so the Newton iteration is done on log(T).
+
+    Nt = N[twosided]
+    at = a[twosided]
+    qbt = qb[twosided]
+    target = qbt - need[twosided]
+    lo = B[twosided]
+    hi = Nt.copy ()
+    lnnorm = gammaln (at)
+    x1 = Nt - ndtri (0.5 * (1 + CL[twosided])) * np.sqrt (Nt)
+    x1 = np.clip (x1, lo + 0.01 * (hi - lo), hi - 0.01 * (hi - lo))
+
+    for _ in range (maxiter):
+        x2 = _upper_for_lower (Nt, x1)
+        T = qbt - gammaincc (at, x1) + gammaincc (at, x2)
+        lo = np.where (T < target, x1, lo)
+        hi = np.where (T < target, hi, x1)
+
+        with np.errstate (divide='ignore', invalid='ignore', over='ignore'):
+            dx2 = (Nt / x1 - 1) / (Nt / x2 - 1)
+            dT = np.exp (Nt * np.log (x1) - x1 - lnnorm) * (1 - dx2)
+            newx1 = x1 - T * np.log (T / target) / dT
+
+        bad = ~((newx1 >= lo) & (newx1 <= hi))
+        newx1[bad] = 0.5 * (lo[bad] + hi[bad])
+        converged = ((np.abs (newx1 - x1) <= rtol * x1) |
+                     (hi - lo <= rtol * x1))
+        x1 = newx1
+
+        if np.all (converged):
+            break
+    else:
+        if Nt.size:
+            raise RuntimeError ('KBN interval failed to converge after %d '
+                                'iterations in %d element(s)'
+                                % (maxiter, (~converged).sum ()))
+
+    smin[twosided] = np.maximum (x1 - B[twosided], 0.)
+    smax[twosided] = _upper_for_lower (Nt, x1) - B[twosided]
+
+    # If Q(N+1, B) underflowed, none of the above means anything.
+
+    hopeless = (qb == 0)
+    smin[hopeless] = smax[hopeless] = np.nan
+
+    return smin.reshape (shape), smax.reshape (shape)
 
 
 def kbn_conf (N, B, CL):
@@ -71,64 +187,14 @@ def kbn_conf (N, B, CL):
 
     which agrees with the entry in Table 2 of KBN91.
 
+    To compute many intervals at once, use `vec_kbn_conf`, which is much
+    faster than calling this function repeatedly.
+
     Reference info: 1991ApJ...374..344K, doi:10.1086/170124
 
     """
+    if np.ndim (N) or np.ndim (B) or np.ndim (CL):
+        raise ValueError ('kbn_conf arguments must be scalars; use vec_kbn_conf')
 
-    tol = 1e-6
-
-    origN = N
-    try:
-        N = int (N)
-        assert N == origN
-    except Exception:
-        raise ValueError ('N must be an integer')
-
-    CL = float (CL)
-    if CL <= 0. or CL >= 1.:
-        raise ValueError ('CL must be between 0 and 1, noninclusive')
-
-    B = float (B)
-    if B < 0:
-        raise ValueError ('B must be nonnegative')
-
-    # OK, arg-checking is out of the way. Precompute some things ...
-
-    C = _cconst (N, B)
-    f = lambda s: _fcnb (C, N, B, s)
-
-    # The goal is find Smin and Smax such that the integral of _fnb between
-    # Smin and Smax is CL, and _fnb (Smin) = _fnb (Smax). Follow the
-    # suggestion in Kraft, Burrows, & Nousek (1991) and start at the
-    # maximum-probability value, integrating outwards trying to maintain the
-    # constraints. We have to be careful because smin cannot go below zero,
-    # and to ignore the enormous typo ("local maximum at S = B + N"!) in the
-    # paper!
-
-    smin = smax = max (N - B, 0.)
-    fmin = f (smin)
-    fmax = f (smax)
-    conf = 0.
-
-    while conf < CL:
-        if smin == 0. or fmin < fmax:
-            stepsize = max (0.2 * abs (CL - conf) / CL / fmax, tol)
-            conf += quad (f, smax, smax + stepsize)[0]
-            smax += stepsize
-            fmax = f (smax)
-        else:
-            stepsize = max (min (0.2 * abs (CL - conf) / CL / fmin, 0.1 * smin), tol)
-            if smin - stepsize < tol:
-                conf += quad (f, 0, smin)[0]
-                smin = 0.
-            else:
-                conf += quad (f, smin - stepsize, smin)[0]
-                smin -= stepsize
-            fmin = f (smin)
-
-    return smin, smax
-
-
-vec_kbn_conf = vectorize (kbn_conf, otypes=[float, float], doc="""Vectorized form of `kbn_conf`.
-
-All three inputs must be broadcastable to a common shape.""")
+    smin, smax = vec_kbn_conf (N, B, CL)
+    return float (smin), float (smax)
@@ -20,7 +20,7 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 # TODO: ditto for nr periods to try?
 # TODO: confidence in peak value or something
 
-__all__ = str ('PDMResult pdm').split ()
+__all__ = str ('adaptive_pdm AdaptivePDMResult PDMResult pdm').split ()
 
 import numpy as np
 from collections import namedtuple
@@ -52,15 +52,237 @@ def one_theta (t, x, wt, period, nbin, nshift, v_all):
     return numer / (denom * v_all)
 
 
-def _map_one_theta (args):
+def block_thetas (t, x, wt, periods, nbin, nshift, v_all):
+    """Compute the theta statistic for a block of trial periods at once.
+
+    The results are the same as calling :func:`one_theta` for each period,
+    but all of the binnings for all of the periods and shifts are handled in
+    a few array operations: each sample is assigned to a (period, shift, bin)
+    cell, and the per-cell sums of weights, weighted values, and weighted
+    squared values are accumulated with :func:`numpy.bincount`. The memory
+    used scales as ``t.size * periods.size * nshift``.
+
+    """
+    periods = np.atleast_1d (periods)
+    nper = periods.size
+
+    # Subtracting the mean doesn't change the variances, but it avoids
+    # roundoff problems when we compute them from the sums of squares.
+    x = x - np.average (x, weights=wt)
+
+    shifts = np.arange (nshift) / (nshift * nbin)
+    phase = (t / periods[:,np.newaxis,np.newaxis] + shifts[:,np.newaxis]) % 1.
+    binloc = np.floor (phase * nbin).astype (np.intp)
+
+    # Roundoff can put a phase of almost 1 into bin number `nbin`; one_theta()
+    # ignores such points, so we route them to an extra, discarded bin.
+    cell = np.arange (nper * nshift).reshape ((nper, nshift, 1)) * (nbin + 1) + binloc
+    cell = cell.ravel ()
+    ncells = nper * nshift * (nbin + 1)
+    shape = (nper, nshift, nbin + 1)
+
+    n = np.bincount (cell, minlength=ncells).reshape (shape)[...,:nbin]
+    w = np.broadcast_to (wt, binloc.shape).ravel ()
+    s0 = np.bincount (cell, w, minlength=ncells).reshape (shape)[...,:nbin]
+    wx = np.broadcast_to (wt * x, binloc.shape).ravel ()
+    s1 = np.bincount (cell, wx, minlength=ncells).reshape (shape)[...,:nbin]
+    wxx = np.broadcast_to (wt * x**2, binloc.shape).ravel ()
+    s2 = np.bincount (cell, wxx, minlength=ncells).reshape (shape)[...,:nbin]
+
+    # For each bin, one_theta() accumulates `weighted_variance * (n - 1)`,
+    # which is `n * sum(w (x - xbar)**2) / sum(w)`.
+
+    ok = (n >= 3)
+
+    with np.errstate (divide='ignore', invalid='ignore'):
+        term = n * (s2 - s1**2 / s0) / s0
+
+    numer = np.where (ok, term, 0.).sum (axis=(1, 2))
+    denom = np.where (ok, n - 1, 0).sum (axis=(1, 2))
+    return numer / (denom * v_all)
+
+
+_block_elements = 1 << 22
+
+def _period_blocks (periods, npts, nshift):
+    """Split up *periods* into blocks that keep the memory usage of
+    :func:`block_thetas` reasonable.
+
+    """
+    n = max (1, _block_elements // (npts * nshift))
+    return [periods[i:i+n] for i in range (0, periods.size, n)]
+
+
+def _map_block_thetas (args):
     """Needed for the parallel map() call in pdm() due to the gross way in which
     Python multiprocessing works.
 
     """
-    return one_theta (*args)
+    return block_thetas (*args)
+
+
+def _map_shuffle_batch (args):
+    """Compute the minimal theta values for a batch of shuffled datasets. Each
+    batch has its own random number generator so that batches can be
+    computed in parallel.
+
+    """
+    t, x, wt, pblocks, nbin, nshift, v_all, seed, n = args
+    rng = np.random.RandomState (seed)
+    tmins = np.empty (n)
+
+    for i in range (n):
+        shuf = rng.permutation (x.size)
+        tmins[i] = min (block_thetas (t, x[shuf], wt[shuf], p, nbin, nshift, v_all).min ()
+                        for p in pblocks)
+
+    return tmins
+
+
+def _map_noise_batch (args):
+    """Compute the best periods for a batch of noise-added datasets, in the same
+    way as :func:`_map_shuffle_batch`.
+
+    """
+    t, x, u, wt, pblocks, nbin, nshift, v_all, seed, n = args
+    rng = np.random.RandomState (seed)
+    periods = np.concatenate (pblocks)
+    pmins = np.empty (n)
+
+    for i in range (n):
+        noised = rng.normal (x, u)
+        thetas = np.concatenate ([block_thetas (t, noised, wt, p, nbin, nshift, v_all)
+                                  for p in pblocks])
+        pmins[i] = periods[thetas.argmin ()]
+
+    return pmins
+
+
+def _batch_sizes (n, batch_size):
+    return [min (batch_size, n - i) for i in range (0, n, batch_size)]
+
+
+def _new_seeds (n):
+    return np.random.randint (0, 2**31 - 1, size=n)
+
+
+def _pvalue_decided (nbelow, ntot, threshold, z=3.29):
+    """Decide whether the Wilson score interval for a Monte Carlo p-value
+    (99.9% confidence by default) lies entirely on one side of *threshold*.
+
+    """
+    phat = nbelow / ntot
+    zz = z**2 / ntot
+    center = (phat + 0.5 * zz) / (1 + zz)
+    halfwidth = z * np.sqrt (phat * (1 - phat) / ntot + 0.25 * zz / ntot) / (1 + zz)
+    return center - halfwidth > threshold or center + halfwidth < threshold
+
+
+_smc_round_batches = 8
+
+def _monte_carlo (map, t, x, u, wt, pblocks, theta_min, nbin, nshift, v_all,
+                  nsmc, numc, mc_batch, smc_threshold):
+    """The Monte Carlo stages of :func:`pdm`. Returns ``(mc_tmins, mc_pvalue,
+    mc_pmins, mc_puncert)``.
+
+    """
+    # First, shuffle the data so that the caller can have some idea as to the
+    # significance of the minimal theta value. If requested, we do this in
+    # rounds and stop once the answer is clear.
+
+    sizes = _batch_sizes (nsmc, mc_batch)
+    if smc_threshold is None:
+        rounds = [sizes]
+    else:
+        rounds = [sizes[i:i+_smc_round_batches]
+                  for i in range (0, len (sizes), _smc_round_batches)]
+
+    mc_tmins = [np.empty (0)]
+    nbelow = ntot = 0
+
+    for rsizes in rounds:
+        seeds = _new_seeds (len (rsizes))
+        res = list (map (_map_shuffle_batch,
+                         [(t, x, wt, pblocks, nbin, nshift, v_all, seed, n)
+                          for seed, n in zip (seeds, rsizes)]))
+        mc_tmins += res
+        ntot += sum (rsizes)
+        nbelow += sum ((r < theta_min).sum () for r in res)
+
+        if smc_threshold is not None and _pvalue_decided (nbelow, ntot, smc_threshold):
+            break
+
+    mc_tmins = np.concatenate (mc_tmins)
+    mc_tmins.sort ()
+    if mc_tmins.size:
+        mc_pvalue = mc_tmins.searchsorted (theta_min) / mc_tmins.size
+    else:
+        mc_pvalue = np.nan # no shuffles, no p-value
+
+    # Now add noise to assess the uncertainty of the period.
+
+    sizes = _batch_sizes (numc, mc_batch)
+    seeds = _new_seeds (len (sizes))
+    mc_pmins = list (map (_map_noise_batch,
+                          [(t, x, u, wt, pblocks, nbin, nshift, v_all, seed, n)
+                           for seed, n in zip (seeds, sizes)]))
+    mc_pmins = np.concatenate ([np.empty (0)] + mc_pmins)
+    mc_pmins.sort ()
+    mc_puncert = mc_pmins.std ()
+
+    return mc_tmins, mc_pvalue, mc_pmins, mc_puncert
+
+
+def _prepare (t, x, u, periods, nbin, nshift, nsmc, numc, mc_batch, weights):
+    """Validate and normalize the arguments shared by :func:`pdm` and
+    :func:`adaptive_pdm`. Returns ``(t, x, u, wt, periods, v_all)``.
+
+    """
+    t = np.asarray (t, dtype=float)
+    x = np.asarray (x, dtype=float)
+    u = np.asarray (u, dtype=float)
+    periods = np.asarray (periods, dtype=float)
+    t, x, u, periods = np.atleast_1d (t, x, u, periods)
+
+    if t.ndim != 1:
+        raise ValueError ('`t` must be <= 1D')
+
+    if x.shape != t.shape:
+        raise ValueError ('`t` and `x` arguments must be the same size')
+
+    if u.shape != t.shape:
+        raise ValueError ('`t` and `u` arguments must be the same size')
+
+    if periods.ndim != 1:
+        raise ValueError ('`periods` must be <= 1D')
+
+    if nbin < 2:
+        raise ValueError ('`nbin` must be at least 2')
+
+    if nshift < 1:
+        raise ValueError ('`nshift` must be at least 1')
+
+    if nsmc < 0:
+        raise ValueError ('`nsmc` must be nonnegative')
 
+    if numc < 0:
+        raise ValueError ('`numc` must be nonnegative')
+
+    if mc_batch < 1:
+        raise ValueError ('`mc_batch` must be at least 1')
+
+    if weights:
+        wt = u
+        u = wt ** -0.5
+    else:
+        wt = u ** -2
 
-def pdm (t, x, u, periods, nbin, nshift=8, nsmc=256, numc=256, weights=False, parallel=True):
+    v_all = weighted_variance (x, wt)
+    return t, x, u, wt, periods, v_all
+
+
+def pdm (t, x, u, periods, nbin, nshift=8, nsmc=256, numc=256, weights=False,
+         mc_batch=16, smc_threshold=None, parallel=True):
     """Perform phase dispersion minimization.
 
     t : 1D array
@@ -84,6 +306,15 @@ def pdm (t, x, u, periods, nbin, nshift=8, nsmc=256, numc=256, weights=False, pa
     weights : bool=False
       if True, 'u' is actually weights, not uncertainties.
       Usually weights = u**-2.
+    mc_batch : int=16
+      number of Monte Carlo datasets processed by each parallel task. Each
+      task uses its own random number generator, seeded from
+      :func:`numpy.random.randint`.
+    smc_threshold : float or None=None
+      if not None, the shuffling test is run sequentially in rounds, and is
+      stopped as soon as a 99.9% confidence interval on `mc_pvalue` lies
+      entirely above or below this value. In that case fewer than `nsmc`
+      shufflings may be computed.
     parallel : default True
       Controls parallelization of the algorithm. Default
       uses all available cores. See `pwkit.parallel.make_parallel_helper`.
@@ -97,11 +328,12 @@ def pdm (t, x, u, periods, nbin, nshift=8, nsmc=256, numc=256, weights=False, pa
     pmin
       the `period` value with the smallest (best) `theta`
     mc_tmins
-      1D array of size `nsmc` with Monte Carlo samplings of minimal
-      theta values for shufflings of the data; assesses significance of the peak
+      1D array of size `nsmc` (or less; see `smc_threshold`) with Monte Carlo
+      samplings of minimal theta values for shufflings of the data; assesses
+      significance of the peak
     mc_pvalue
       probability (between 0 and 1) of obtaining the best theta value
-      in a randomly-shuffled dataset
+      in a randomly-shuffled dataset; NaN if `nsmc` is zero
     mc_pmins
       1D array of size `numc` with Monte Carlo samplings of best
       period values for noise-added data; assesses uncertainty of `pmin`
@@ -110,93 +342,144 @@ def pdm (t, x, u, periods, nbin, nshift=8, nsmc=256, numc=256, weights=False, pa
       on `pmin`.
 
     We don't do anything clever, so runtime scales at least as
-    ``t.size * periods.size * nbin * nshift * (nsmc + numc + 1)``.
+    ``t.size * periods.size * nshift * (nsmc + numc + 1)``. The theta values
+    for blocks of periods are computed with :func:`block_thetas`.
 
     """
-    t = np.asfarray (t)
-    x = np.asfarray (x)
-    u = np.asfarray (u)
-    periods = np.asfarray (periods)
-    t, x, u, periods = np.atleast_1d (t, x, u, periods)
     nbin = int (nbin)
     nshift = int (nshift)
     nsmc = int (nsmc)
     numc = int (numc)
+    mc_batch = int (mc_batch)
     phelp = make_parallel_helper (parallel)
+    t, x, u, wt, periods, v_all = _prepare (t, x, u, periods, nbin, nshift, nsmc,
+                                            numc, mc_batch, weights)
 
-    if t.ndim != 1:
-        raise ValueError ('`t` must be <= 1D')
+    pblocks = _period_blocks (periods, t.size, nshift)
 
-    if x.shape != t.shape:
-        raise ValueError ('`t` and `x` arguments must be the same size')
+    with phelp.get_map () as map:
+        get_thetas = lambda args: np.concatenate (list (map (_map_block_thetas, args)))
+        thetas = get_thetas ((t, x, wt, p, nbin, nshift, v_all)
+                             for p in pblocks)
+        imin = thetas.argmin ()
+        pmin = periods[imin]
+        mc_tmins, mc_pvalue, mc_pmins, mc_puncert = \
+            _monte_carlo (map, t, x, u, wt, pblocks, thetas[imin], nbin, nshift,
+                          v_all, nsmc, numc, mc_batch, smc_threshold)
 
-    if u.shape != t.shape:
-        raise ValueError ('`t` and `u` arguments must be the same size')
+    # All done.
 
-    if periods.ndim != 1:
-        raise ValueError ('`periods` must be <= 1D')
+    return PDMResult (thetas=thetas, imin=imin, pmin=pmin, mc_tmins=mc_tmins,
+                      mc_pvalue=mc_pvalue, mc_pmins=mc_pmins,
+                      mc_puncert=mc_puncert)
 
-    if nbin < 2:
-        raise ValueError ('`nbin` must be at least 2')
 
-    if nshift < 1:
-        raise ValueError ('`nshift` must be at least 1')
+AdaptivePDMResult = namedtuple ('AdaptivePDMResult', PDMResult._fields + ('periods',))
 
-    if nsmc < 0:
-        raise ValueError ('`nsmc` must be nonnegative')
 
-    if numc < 0:
-        raise ValueError ('`numc` must be nonnegative')
+def _local_minima (thetas, nkeep):
+    """Return the indices of the *nkeep* smallest local minima of *thetas*."""
+    padded = np.concatenate (([np.inf], thetas, [np.inf]))
+    ismin = (thetas <= padded[:-2]) & (thetas <= padded[2:])
+    idx = np.flatnonzero (ismin)
+    return idx[np.argsort (thetas[idx], kind='mergesort')[:nkeep]]
 
-    # We can finally get started!
 
-    if weights:
-        wt = u
-        u = wt ** -0.5
-    else:
-        wt = u ** -2
+def adaptive_pdm (t, x, u, periods, nbin, resolution, nkeep=5, nrefine=16, nshift=8,
+                  nsmc=256, numc=256, weights=False, mc_batch=16, smc_threshold=None,
+                  parallel=True):
+    """Perform phase dispersion minimization with an adaptively refined period
+    grid.
 
-    v_all = weighted_variance (x, wt)
+    t, x, u, nbin, nshift, nsmc, numc, weights, mc_batch, smc_threshold, parallel
+      As in :func:`pdm`.
+    periods : 1D array
+      the initial, coarse, set of candidate periods to sample
+    resolution : float
+      the desired period resolution around the best minima; same units as `t`
+    nkeep : int=5
+      number of the deepest local minima of theta to refine in each round
+    nrefine : int=16
+      number of new periods to sample between the neighbors of each refined
+      minimum in each round
+
+    Returns a named tuple with the same fields as the one returned by
+    :func:`pdm`, plus:
 
-    with phelp.get_map () as map:
-        get_thetas = lambda args: np.asarray (map (_map_one_theta, args))
-        thetas = get_thetas ((t, x, wt, p, nbin, nshift, v_all)
-                             for p in periods)
-        imin = thetas.argmin ()
-        pmin = periods[imin]
+    periods : 1D array
+      the sorted set of all periods at which theta was evaluated; the `thetas`
+      and `imin` fields index into this array
+
+    Theta is first computed on the coarse grid. Then, repeatedly, the `nkeep`
+    deepest local minima are identified and the grid is filled in between
+    each minimum's neighbors, until the grid spacing around every one of them
+    is no larger than `resolution`. This way, wide period ranges can be
+    searched without computing theta at full resolution everywhere. The Monte
+    Carlo stages are run on the final, nonuniform grid.
+
+    """
+    nbin = int (nbin)
+    nshift = int (nshift)
+    nsmc = int (nsmc)
+    numc = int (numc)
+    mc_batch = int (mc_batch)
+    nkeep = int (nkeep)
+    nrefine = int (nrefine)
+    phelp = make_parallel_helper (parallel)
+    t, x, u, wt, periods, v_all = _prepare (t, x, u, periods, nbin, nshift, nsmc,
+                                            numc, mc_batch, weights)
 
-        # Now do the Monte Carlo jacknifing so that the caller can have some idea
-        # as to the significance of the minimal value of `thetas`.
+    if not (resolution > 0):
+        raise ValueError ('`resolution` must be positive')
 
-        mc_thetas = np.empty (periods.shape)
-        mc_tmins = np.empty (nsmc)
+    if nkeep < 1:
+        raise ValueError ('`nkeep` must be at least 1')
 
-        for i in range (nsmc):
-            shuf = np.random.permutation (x.size)
-            # Note that what we do here is very MapReduce-y. I'm not aware of
-            # an easy way to implement this computation in that model, though.
-            mc_thetas = get_thetas ((t, x[shuf], wt[shuf], p, nbin, nshift, v_all)
-                                    for p in periods)
-            mc_tmins[i] = mc_thetas.min ()
+    if nrefine < 1:
+        raise ValueError ('`nrefine` must be at least 1')
 
-        mc_tmins.sort ()
-        mc_pvalue = mc_tmins.searchsorted (thetas[imin]) / nsmc
+    periods = np.unique (periods)
 
-        # Now add noise to assess the uncertainty of the period.
+    with phelp.get_map () as map:
+        def get_thetas (pers):
+            return np.concatenate (list (map (_map_block_thetas,
+                                              ((t, x, wt, p, nbin, nshift, v_all)
+                                               for p in _period_blocks (pers, t.size, nshift)))))
 
-        mc_pmins = np.empty (numc)
+        thetas = get_thetas (periods)
 
-        for i in range (numc):
-            noised = np.random.normal (x, u)
-            mc_thetas = get_thetas ((t, noised, wt, p, nbin, nshift, v_all)
-                                    for p in periods)
-            mc_pmins[i] = periods[mc_thetas.argmin ()]
+        while True:
+            new = []
 
-        mc_pmins.sort ()
-        mc_puncert = mc_pmins.std ()
+            for i in _local_minima (thetas, nkeep):
+                lo = periods[max (i - 1, 0)]
+                hi = periods[min (i + 1, periods.size - 1)]
 
-    # All done.
+                if max (periods[i] - lo, hi - periods[i]) <= resolution:
+                    continue
 
-    return PDMResult (thetas=thetas, imin=imin, pmin=pmin, mc_tmins=mc_tmins,
-                      mc_pvalue=mc_pvalue, mc_pmins=mc_pmins,
-                      mc_puncert=mc_puncert)
+                new.append (np.linspace (lo, hi, nrefine + 2)[1:-1])
+
+            if not len (new):
+                break
+
+            new = np.setdiff1d (np.concatenate (new), periods)
+            if not new.size:
+                break
+
+            periods = np.concatenate ((periods, new))
+            thetas = np.concatenate ((thetas, get_thetas (new)))
+            order = np.argsort (periods)
+            periods = periods[order]
+            thetas = thetas[order]
+
+        imin = thetas.argmin ()
+        pmin = periods[imin]
+        pblocks = _period_blocks (periods, t.size, nshift)
+        mc_tmins, mc_pvalue, mc_pmins, mc_puncert = \
+            _monte_carlo (map, t, x, u, wt, pblocks, thetas[imin], nbin, nshift,
+                          v_all, nsmc, numc, mc_batch, smc_threshold)
+
+    return AdaptivePDMResult (thetas=thetas, imin=imin, pmin=pmin, mc_tmins=mc_tmins,
+                              mc_pvalue=mc_pvalue, mc_pmins=mc_pmins,
+                              mc_puncert=mc_puncert, periods=periods)
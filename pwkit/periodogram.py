@@ -0,0 +1,343 @@
+# -*- mode: python; coding: utf-8 -*-
+# Copyright 2016 Peter Williams <peter@newton.cx> and collaborators.
+# Licensed under the MIT License.
+
+"""pwkit.periodogram - fast Lomb-Scargle periodograms
+
+This module computes the "generalized" or "floating-mean" Lomb-Scargle
+periodogram of Zechmeister & Kürster (2009A&A...496..577Z), in which a
+weighted sinusoid plus constant offset is fit at each trial frequency. The
+sums over the data are evaluated with the O(N log N) extirpolation-and-FFT
+method of Press & Rybicki (1989ApJ...338..277P), following the
+implementation in the AstroML and Astropy packages by Jake Vanderplas.
+
+Uncertainties and weights follow the same convention as :mod:`pwkit.pdm`.
+
+Functions are:
+
+:func:`lomb_scargle`
+  Compute a periodogram on a regular frequency grid.
+:func:`batch_lomb_scargle`
+  Compute periodograms for many datasets, possibly in parallel.
+:func:`periodogram`
+  Compute a periodogram along with a Monte Carlo estimate of the
+  false-alarm probability of its peak.
+
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+__all__ = str ('batch_lomb_scargle lomb_scargle periodogram PeriodogramResult').split ()
+
+from collections import namedtuple
+from six.moves import range
+import numpy as np
+
+from .parallel import make_parallel_helper
+
+PeriodogramResult = namedtuple ('PeriodogramResult', 'freqs power imax fmax '
+                                'mc_pmaxes mc_fap'.split ())
+
+
+def _bitceil (n):
+    """Return the smallest power of 2 that is at least *n*."""
+    return 1 << int (np.ceil (np.log2 (max (n, 1))))
+
+
+def _extirpolate (x, y, n, m):
+    """Spread the values *y*, sampled at the positions *x*, onto the integer grid
+    ``0 ... n - 1`` such that sums of smooth functions over the original
+    positions are well approximated by sums over the grid. This uses
+    Lagrange-polynomial "extirpolation" over *m* grid points; see Press &
+    Rybicki (1989).
+
+    """
+    from math import factorial
+
+    result = np.zeros (n)
+
+    # Values that land exactly on grid points are easy.
+    exact = (x % 1 == 0)
+    result += np.bincount (x[exact].astype (np.intp), y[exact], minlength=n)
+    x = x[~exact]
+    y = y[~exact]
+
+    ilo = np.clip ((x - m // 2).astype (np.intp), 0, n - m)
+    numerator = y * np.prod (x - ilo - np.arange (m)[:,np.newaxis], axis=0)
+    denominator = factorial (m - 1)
+
+    for j in range (m):
+        if j > 0:
+            denominator *= j / (j - m)
+        idx = ilo + (m - 1 - j)
+        result += np.bincount (idx, numerator / (denominator * (x - idx)), minlength=n)
+
+    return result
+
+
+def _trig_sums (t, h, f0, df, nf, freq_factor=1, method='fast', oversampling=5, mfft=4):
+    """Compute ``S_j = sum (h sin (2 pi f_j t))`` and ``C_j = sum (h cos (2 pi
+    f_j t))`` for the frequencies ``f_j = freq_factor * (f0 + j df)``,
+    ``j = 0 ... nf - 1``. Returns ``(S, C)``.
+
+    """
+    f0 = f0 * freq_factor
+    df = df * freq_factor
+
+    if method == 'direct':
+        f = f0 + df * np.arange (nf)
+        arg = 2 * np.pi * f * t[:,np.newaxis]
+        return np.dot (h, np.sin (arg)), np.dot (h, np.cos (arg))
+
+    if method != 'fast':
+        raise ValueError ('unrecognized periodogram method %r' % (method,))
+
+    nfft = _bitceil (nf * oversampling)
+    t0 = t.min ()
+    tnorm = ((t - t0) * nfft * df) % nfft
+
+    if f0 > 0:
+        ph = h * np.exp (2j * np.pi * f0 * (t - t0))
+        grid = (_extirpolate (tnorm, ph.real, nfft, mfft) +
+                1j * _extirpolate (tnorm, ph.imag, nfft, mfft))
+    else:
+        grid = _extirpolate (tnorm, h, nfft, mfft)
+
+    fftgrid = np.fft.ifft (grid)[:nf]
+
+    if t0 != 0:
+        f = f0 + df * np.arange (nf)
+        fftgrid *= np.exp (2j * np.pi * t0 * f)
+
+    return nfft * fftgrid.imag, nfft * fftgrid.real
+
+
+def lomb_scargle (t, x, u, f0, df, nf, weights=False, method='fast',
+                  oversampling=5, mfft=4):
+    """Compute a floating-mean Lomb-Scargle periodogram.
+
+    t : 1D array
+      time coordinate
+    x : 1D array, same size as *t*
+      observed value
+    u : 1D array, same size as *t*
+      uncertainty on observed value; same units as `x`
+    f0 : float
+      the first frequency to sample; units of 1 / `t`
+    df : float
+      the frequency spacing
+    nf : int
+      the number of frequencies to sample
+    weights : bool=False
+      if True, 'u' is actually weights, not uncertainties.
+      Usually weights = u**-2.
+    method : str="fast"
+      "fast" to use the O(N log N) approximation of Press & Rybicki; "direct"
+      to evaluate the sums exactly, in O(N * nf) time.
+    oversampling : int=5
+      for the "fast" method, the FFT grid is at least this many times larger
+      than `nf`.
+    mfft : int=4
+      for the "fast" method, the number of grid points used to extirpolate
+      each data point.
+
+    Returns a 1D array of size `nf` giving the power at each frequency
+    ``f0 + i * df``, normalized such that it lies between 0 and 1: the
+    fractional reduction in weighted chi-squared relative to a constant model.
+    The power at zero frequency, if sampled, is zero.
+
+    """
+    t = np.atleast_1d (np.asarray (t, dtype=float))
+    x = np.atleast_1d (np.asarray (x, dtype=float))
+    u = np.atleast_1d (np.asarray (u, dtype=float))
+    nf = int (nf)
+
+    if t.ndim != 1:
+        raise ValueError ('`t` must be <= 1D')
+
+    if x.shape != t.shape:
+        raise ValueError ('`t` and `x` arguments must be the same size')
+
+    if u.shape != t.shape:
+        raise ValueError ('`t` and `u` arguments must be the same size')
+
+    if not (df > 0):
+        raise ValueError ('`df` must be positive')
+
+    if f0 < 0:
+        raise ValueError ('`f0` must be nonnegative')
+
+    if nf < 1:
+        raise ValueError ('`nf` must be at least 1')
+
+    if weights:
+        wt = u.copy ()
+    else:
+        wt = u ** -2
+
+    wt /= wt.sum ()
+    x = x - np.dot (wt, x)
+    kwargs = dict (method=method, oversampling=oversampling, mfft=mfft)
+
+    sh, ch = _trig_sums (t, wt * x, f0, df, nf, **kwargs)
+    s2, c2 = _trig_sums (t, wt, f0, df, nf, freq_factor=2, **kwargs)
+    s, c = _trig_sums (t, wt, f0, df, nf, **kwargs)
+
+    # Rather than computing the phase offset tau explicitly, we use trig
+    # identities to get its sines and cosines from tan (2 omega tau).
+
+    with np.errstate (divide='ignore', invalid='ignore'):
+        tan2wt = (s2 - 2 * s * c) / (c2 - (c * c - s * s))
+        c2w = 1 / np.sqrt (1 + tan2wt * tan2wt)
+        s2w = tan2wt * c2w
+        cw = np.sqrt (0.5 * (1 + c2w))
+        sw = np.sign (s2w) * np.sqrt (0.5 * (1 - c2w))
+
+        yy = np.dot (wt, x**2)
+        yc = ch * cw + sh * sw
+        ys = sh * cw - ch * sw
+        cc = 0.5 * (1 + c2 * c2w + s2 * s2w) - (c * cw + s * sw)**2
+        ss = 0.5 * (1 - c2 * c2w - s2 * s2w) - (s * cw - c * sw)**2
+        power = (yc * yc / cc + ys * ys / ss) / yy
+
+    # At zero frequency the sinusoid is degenerate with the constant offset,
+    # so it can't reduce chi-squared at all; the formula above gives 0/0 or
+    # infinity there.
+    if f0 == 0:
+        power[0] = 0.
+
+    return power
+
+
+def _map_lomb_scargle (args):
+    """Needed for the parallel map() calls in this module due to the gross way in
+    which Python multiprocessing works.
+
+    """
+    t, x, u, f0, df, nf, kwargs = args
+    return lomb_scargle (t, x, u, f0, df, nf, **kwargs)
+
+
+def batch_lomb_scargle (datasets, f0, df, nf, parallel=True, **kwargs):
+    """Compute floating-mean Lomb-Scargle periodograms for many datasets.
+
+    datasets : iterable of ``(t, x, u)`` tuples
+      the data to analyze, with the same meanings as in :func:`lomb_scargle`
+    f0, df, nf
+      the frequency grid, as in :func:`lomb_scargle`; it is shared by all
+      of the datasets
+    parallel : default True
+      Controls parallelization of the algorithm. Default
+      uses all available cores. See `pwkit.parallel.make_parallel_helper`.
+    kwargs
+      passed to :func:`lomb_scargle`
+
+    Returns a 2D array of shape ``(ndatasets, nf)``.
+
+    """
+    phelp = make_parallel_helper (parallel)
+
+    with phelp.get_map () as map:
+        powers = list (map (_map_lomb_scargle,
+                            [(t, x, u, f0, df, nf, kwargs) for t, x, u in datasets]))
+
+    if not len (powers):
+        return np.empty ((0, int (nf)))
+    return np.array (powers)
+
+
+def _map_shuffle_batch (args):
+    """Compute the maximal periodogram powers for a batch of shuffled datasets.
+    Each batch has its own random number generator so that batches can be
+    computed in parallel.
+
+    """
+    t, x, u, f0, df, nf, kwargs, seed, n = args
+    rng = np.random.RandomState (seed)
+    pmaxes = np.empty (n)
+
+    for i in range (n):
+        shuf = rng.permutation (x.size)
+        pmaxes[i] = lomb_scargle (t, x[shuf], u[shuf], f0, df, nf, **kwargs).max ()
+
+    return pmaxes
+
+
+def periodogram (t, x, u, f0, df, nf, nmc=256, weights=False, mc_batch=16,
+                 parallel=True, **kwargs):
+    """Compute a floating-mean Lomb-Scargle periodogram and assess the
+    significance of its peak.
+
+    t, x, u, f0, df, nf, weights
+      As in :func:`lomb_scargle`.
+    nmc : int=256
+      number of Monte Carlo shufflings to compute, to evaluate the
+      significance of the maximal power.
+    mc_batch : int=16
+      number of Monte Carlo datasets processed by each parallel task. Each
+      task uses its own random number generator, seeded from
+      :func:`numpy.random.randint`.
+    parallel : default True
+      Controls parallelization of the algorithm. Default
+      uses all available cores. See `pwkit.parallel.make_parallel_helper`.
+    kwargs
+      passed to :func:`lomb_scargle`
+
+    Returns named tuple of:
+
+    freqs : 1D array
+      the sampled frequencies
+    power : 1D array
+      the periodogram power, same size as `freqs`
+    imax
+      index of the largest value in `power`
+    fmax
+      the frequency with the largest power
+    mc_pmaxes
+      sorted 1D array of size `nmc` with Monte Carlo samplings of the maximal
+      power for shufflings of the data
+    mc_fap
+      the Monte Carlo false-alarm probability: the fraction (between 0 and
+      1) of shuffled datasets with a maximal power at least as large as that
+      of the actual data; NaN if `nmc` is zero
+
+    The shuffling test is the same as the one used by :func:`pwkit.pdm.pdm`:
+    the data values and uncertainties are permuted together relative to the
+    time stamps.
+
+    """
+    t = np.atleast_1d (np.asarray (t, dtype=float))
+    x = np.atleast_1d (np.asarray (x, dtype=float))
+    u = np.atleast_1d (np.asarray (u, dtype=float))
+    nf = int (nf)
+    nmc = int (nmc)
+    mc_batch = int (mc_batch)
+
+    if nmc < 0:
+        raise ValueError ('`nmc` must be nonnegative')
+
+    if mc_batch < 1:
+        raise ValueError ('`mc_batch` must be at least 1')
+
+    kwargs['weights'] = weights
+    freqs = f0 + df * np.arange (nf)
+    power = lomb_scargle (t, x, u, f0, df, nf, **kwargs)
+    imax = power.argmax ()
+
+    sizes = [min (mc_batch, nmc - i) for i in range (0, nmc, mc_batch)]
+    seeds = np.random.randint (0, 2**31 - 1, size=len (sizes))
+    phelp = make_parallel_helper (parallel)
+
+    with phelp.get_map () as map:
+        mc_pmaxes = list (map (_map_shuffle_batch,
+                               [(t, x, u, f0, df, nf, kwargs, seed, n)
+                                for seed, n in zip (seeds, sizes)]))
+
+    mc_pmaxes = np.concatenate ([np.empty (0)] + mc_pmaxes)
+    mc_pmaxes.sort ()
+    if nmc:
+        mc_fap = (nmc - mc_pmaxes.searchsorted (power[imax])) / nmc
+    else:
+        mc_fap = np.nan # no shufflings, no FAP
+
+    return PeriodogramResult (freqs=freqs, power=power, imax=imax, fmax=freqs[imax],
+                              mc_pmaxes=mc_pmaxes, mc_fap=mc_fap)
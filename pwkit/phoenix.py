@@ -6,6 +6,7 @@
 
 Functions:
 
+- load_grid - Load many model spectra onto a common wavelength grid.
 - load_spectrum - Load a model spectrum into a Pandas DataFrame.
 
 Requires Pandas.
@@ -36,12 +37,121 @@ The files do not come sorted!
 """
 from __future__ import absolute_import, division, print_function, unicode_literals
 
-__all__ = str ('load_spectrum').split ()
+__all__ = str ('load_grid load_spectrum parse_filename').split ()
 
-import numpy as np, pandas as pd
+import io, os, re
+import numpy as np, pandas as pd, six
 
 
-def load_spectrum (path, smoothing=181):
+def _read_bytes (path):
+    """Read the contents of a possibly-compressed file."""
+    if path.endswith ('.gz'):
+        import gzip
+        opener = gzip.open
+    elif path.endswith ('.bz2'):
+        import bz2
+        opener = bz2.BZ2File
+    elif path.endswith ('.xz'):
+        try:
+            import lzma
+        except ImportError:
+            from backports import lzma
+        opener = lzma.open
+    else:
+        opener = open
+
+    with opener (path, 'rb') as f:
+        return f.read ()
+
+
+_merged_sign_re = re.compile (br'(?<=[0-9.])([-+])(?=[0-9.])')
+
+def _parse_spectrum (data):
+    """Parse the text of a Phoenix spectrum file, returning arrays of the
+    wavelengths and log10 fluxes, in file order.
+
+    The files use Fortran-style exponents ("1.0D+01"), and in some files
+    neighboring columns run together when the second value is negative. We
+    use the Pandas C parser, which is far faster than :func:`numpy.loadtxt`.
+
+    """
+    data = data.replace (b'D', b'E')
+
+    def parse (data):
+        df = pd.read_csv (io.BytesIO (data), sep=r'\s+', header=None,
+                          usecols=[0, 1], dtype=float)
+        return df[0].values, df[1].values
+
+    try:
+        return parse (data)
+    except ValueError:
+        # A sign that follows a digit, rather than an exponent marker or
+        # whitespace, starts a new column.
+        return parse (_merged_sign_re.sub (br' \1', data))
+
+
+def _cache_path (path, cache_dir):
+    """Get the path of the cache file for the spectrum file *path*. The name
+    depends on the absolute path of the file and on its modification time and
+    size, so that outdated cache files are never used.
+
+    """
+    from hashlib import sha1
+
+    path = os.path.abspath (path)
+    st = os.stat (path)
+    key = sha1 (path.encode ('utf8')).hexdigest ()
+    return os.path.join (cache_dir, '%s-%d-%d.npy' % (key, int (st.st_mtime * 1e6), st.st_size))
+
+
+def _load_sorted (path, cache_dir):
+    """Load the wavelengths and fluxes of a spectrum, sorted by wavelength, as
+    a (2, n) array. If *cache_dir* is not None, we use a binary copy of the
+    data stored there if it is available, and create one if not.
+
+    """
+    if cache_dir is None:
+        cpath = None
+    else:
+        cpath = _cache_path (path, cache_dir)
+
+        try:
+            return np.load (cpath, mmap_mode='r')
+        except IOError:
+            pass
+
+    ang, lflam = _parse_spectrum (_read_bytes (path))
+
+    # Data files do not come sorted!
+    z = ang.argsort (kind='mergesort')
+    data = np.empty ((2, ang.size))
+    data[0] = ang[z]
+    data[1] = 10**lflam[z]
+    del z
+
+    if cpath is not None:
+        from .io import ensure_dir
+        ensure_dir (cache_dir, parents=True)
+
+        # Remove cache files for outdated versions of this spectrum, then
+        # write atomically so that concurrent readers never see partial data.
+        prefix = os.path.basename (cpath).split ('-')[0] + '-'
+        for name in os.listdir (cache_dir):
+            if name.startswith (prefix) and name.endswith ('.npy'):
+                try:
+                    os.unlink (os.path.join (cache_dir, name))
+                except OSError:
+                    pass
+
+        tmp = '%s.%d.tmp' % (cpath, os.getpid ())
+        with open (tmp, 'wb') as f:
+            np.save (f, data)
+        os.rename (tmp, cpath)
+
+    return data
+
+
+def load_spectrum (path, smoothing=181, cache_dir=None):
     """Load a Phoenix model atmosphere spectrum.
 
     path : string
@@ -50,6 +160,10 @@ def load_spectrum (path, smoothing=181):
       Smoothing to apply. If None, do not smooth. If an integer, smooth with a
       Hamming window. Otherwise, the variable is assumed to be a different
       smoothing window, and the data will be convolved with it.
+    cache_dir : string or None
+      A directory in which to cache binary copies of the loaded spectra. If
+      None, the value of the environment variable ``PWKIT_PHOENIX_CACHE`` is
+      used, if it is set. If False, or if neither is set, no cache is used.
 
     Returns a Pandas DataFrame containing the columns:
 
@@ -58,17 +172,20 @@ def load_spectrum (path, smoothing=181):
     flam
       Flux density in erg/cm²/s/Å. See `pwkit.synphot` for related tools.
 
-    Loading takes about 5 seconds on my current laptop. Un-smoothed spectra
-    have about 630,000 samples.
+    Un-smoothed spectra have about 630,000 samples. Parsing a spectrum file
+    takes about a second. If a cache is used, subsequent loads of the same
+    file, so long as it is not modified, are memory-mapped reads of the
+    sorted data that take milliseconds. The cache files are about 10 MB each.
 
     """
-    ang, lflam = np.loadtxt (path, usecols=(0,1)).T
+    if cache_dir is None:
+        cache_dir = os.environ.get ('PWKIT_PHOENIX_CACHE')
+    if cache_dir is False or cache_dir == '':
+        cache_dir = None
 
-    # Data files do not come sorted!
-    z = ang.argsort ()
-    ang = ang[z]
-    flam = 10**lflam[z]
-    del z
+    data = _load_sorted (path, cache_dir)
+    ang = data[0]
+    flam = data[1]
 
     if smoothing is not None:
         if isinstance (smoothing, int):
@@ -78,8 +195,103 @@ def load_spectrum (path, smoothing=181):
 
         wnorm = np.convolve (np.ones_like (smoothing), smoothing, mode='valid')
         smoothing = smoothing / wnorm # do not alter original array.
-        smooth = lambda a: np.convolve (a, smoothing, mode='valid')[::smoothing.size]
+
+        # We only keep every n'th sample of the "valid" convolution, where n
+        # is the window size. That's the same as a dot product of the window
+        # with non-overlapping chunks of the data.
+        n = smoothing.size
+        nout = ang.size // n
+        kernel = smoothing[::-1]
+        smooth = lambda a: np.dot (a[:nout*n].reshape ((nout, n)), kernel)
         ang = smooth (ang)
         flam = smooth (flam)
+    else:
+        ang = np.array (ang)
+        flam = np.array (flam)
 
     return pd.DataFrame ({'wlen': ang, 'flam': flam})
+
+
+_filename_re = re.compile (r'^lte([0-9.]+)([-+][0-9.]+)([-+][0-9.]+)(?:a([-+][0-9.]+))?\.')
+
+def parse_filename (path):
+    """Parse the model parameters from the name of a Phoenix spectrum file.
+
+    Returns a tuple ``(teff, logg, mh, alpha)`` of the effective temperature
+    in K, log10 of the surface gravity in cgs, the metallicity [M/H], and the
+    alpha-element enhancement [alpha/H], which is zero if not specified.
+    Raises :exc:`ValueError` if the name does not follow the standard
+    pattern. Note that, by convention, a "-" precedes non-negative values of
+    log g.
+
+    """
+    m = _filename_re.match (os.path.basename (path))
+    if m is None:
+        raise ValueError ('cannot parse Phoenix model parameters from file name %r' % path)
+
+    teff = 100 * float (m.group (1))
+    logg = -float (m.group (2))
+    mh = float (m.group (3)) + 0. # no negative zero
+    alpha = float (m.group (4) or 0.)
+    return teff, logg, mh, alpha
+
+
+def _map_load_grid (args):
+    """Needed for the parallel map() call in load_grid() due to the gross way in
+    which Python multiprocessing works.
+
+    """
+    path, wlen, smoothing, cache_dir = args
+    df = load_spectrum (path, smoothing=smoothing, cache_dir=cache_dir)
+    return np.interp (wlen, df.wlen.values, df.flam.values, left=np.nan, right=np.nan)
+
+
+def load_grid (paths, wlen, smoothing=181, cache_dir=None, parallel=True):
+    """Load many Phoenix model spectra, resampled onto a common wavelength grid.
+
+    paths : string or iterable of strings
+      The files to load. If a single string, it names a directory, and all of
+      the files in it whose names start with "lte" are loaded.
+    wlen : 1D array
+      The wavelengths onto which to resample the spectra, in Angstrom.
+    smoothing
+      The smoothing to apply to each spectrum before resampling; see
+      :func:`load_spectrum`.
+    cache_dir
+      The spectrum cache directory; see :func:`load_spectrum`.
+    parallel : default True
+      Controls parallelization of the loading. Default uses all available
+      cores. See `pwkit.parallel.make_parallel_helper`.
+
+    Returns a tuple ``(params, flam)``. *params* is a Pandas DataFrame with
+    columns "teff", "logg", "mh", "alpha", and "path", as determined by
+    :func:`parse_filename`, sorted by those values. *flam* is an array of
+    shape ``(n_models, wlen.size)``, whose rows are the spectra of the models
+    in the same order, linearly interpolated onto *wlen*. Wavelengths outside
+    of the range of a model are filled with NaN.
+
+    """
+    from .parallel import make_parallel_helper
+
+    if isinstance (paths, six.string_types):
+        paths = [os.path.join (paths, n) for n in os.listdir (paths) if n.startswith ('lte')]
+
+    rows = [parse_filename (p) + (p,) for p in paths]
+    rows.sort ()
+    params = pd.DataFrame (rows, columns=['teff', 'logg', 'mh', 'alpha', 'path'])
+    wlen = np.asarray (wlen, dtype=float)
+
+    if wlen.ndim != 1:
+        raise ValueError ('wlen must be 1D')
+
+    phelp = make_parallel_helper (parallel)
+
+    with phelp.get_map () as map:
+        spectra = list (map (_map_load_grid,
+                             [(p, wlen, smoothing, cache_dir) for p in params.path]))
+
+    flam = np.empty ((len (spectra), wlen.size))
+    for i, s in enumerate (spectra):
+        flam[i] = s
+
+    return params, flam
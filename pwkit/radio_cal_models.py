@@ -8,10 +8,19 @@ From the command line::
 
     python -m pwkit.radio_cal_models [-f] <source> <freq[mhz]>
     python -m pwkit.radio_cal_models [-f] CasA     <freq[mhz]> <year>
+    python -m pwkit.radio_cal_models [-f] --batch  [<file>]
 
 Print the flux density of the specified calibrator at the specified frequency,
 in Janskys.
 
+In batch mode, rows of the form "<source> <freq[mhz]> [<year>]" are read from
+<file>, or from standard input if <file> is "-" or not given, and one result
+is printed for each row. Blank lines and lines starting with "#" are ignored.
+Rows are processed in blocks, with all of the rows for each source in a block
+evaluated at once, so this is much faster than running the program once per
+frequency. Rows that cannot be evaluated yield "nan" results and a warning
+giving their line numbers, and the program exits with an error code at the end.
+
 Arguments:
 
 <source>
@@ -25,11 +34,13 @@ Arguments:
   activates "flux" mode, where a three-item string is
   printed that can be passed to MIRIAD tasks that accept a
   model flux and spectral index argument.
+``--batch``
+  activates batch mode, as described above.
 
 """
 from __future__ import absolute_import, division, print_function, unicode_literals
 
-__all__ = str ('cas_a commandline init_cas_a models spindexes').split ()
+__all__ = str ('batch_fluxdens cas_a commandline init_cas_a models spindexes').split ()
 
 
 import six
@@ -52,16 +63,29 @@ def cas_a (freq_mhz, year):
 
     Returns: s, flux in Jy.
 
+    Both arguments may be Numpy arrays, in which case they are broadcast
+    against each other.
+
     """
     # The snu rule is right out of Baars et al. The dnu is corrected
     # for the frequency being measured in MHz, not GHz.
 
-    snu = 10. ** (5.745 - 0.770 * np.log10 (freq_mhz)) # Jy
-    dnu = 0.01 * (0.07 - 0.30 * np.log10 (freq_mhz)) # percent per yr.
-    loss = (1 - dnu) ** (year - 1980.)
+    lf = np.log10 (freq_mhz)
+    snu = 10. ** (5.745 - 0.770 * lf) # Jy
+    dnu = 0.01 * (0.07 - 0.30 * lf) # percent per yr.
+    loss = (1 - dnu) ** (np.asarray (year) - 1980.)
     return snu * loss
 
 
+def _cas_a_spindex (freq_mhz, year):
+    """The spectral index of the Cas A model of :func:`cas_a`: the derivative of
+    its log-flux with respect to log-frequency.
+
+    """
+    dnu = 0.01 * (0.07 - 0.30 * np.log10 (freq_mhz))
+    return -0.770 + 0.003 * (np.asarray (year) - 1980.) / ((1 - dnu) * np.log (10))
+
+
 def init_cas_a (year):
     """Insert an entry for Cas A into the table of models. Need to specify the
     year of the observations to account for the time variation of Cas A's
@@ -70,23 +94,35 @@ def init_cas_a (year):
     """
     year = float (year)
     models['CasA'] = lambda f: cas_a (f, year)
+    spindexes['CasA'] = lambda f: _cas_a_spindex (f, year)
 
 
 # Other models from Baars et al. 1977 -- data from Table 5 in that paper. Some
 # of these will be overwritten by VLA models below.
 
+def _check_freq_limits (freq_mhz, fmin, fmax):
+    """Raise a PKError if any of the frequencies in *freq_mhz* are outside of the
+    range [*fmin*, *fmax*]. Returns *freq_mhz* as a Numpy array.
+
+    """
+    freq_mhz = np.asarray (freq_mhz)
+
+    if np.any (freq_mhz < fmin) or np.any (freq_mhz > fmax):
+        bad = freq_mhz[(freq_mhz < fmin) | (freq_mhz > fmax)]
+        raise PKError ('going beyond frequency limits of model: want '
+                       '%f, but validity is [%f, %f]', bad.flat[0], fmin, fmax)
+
+    return freq_mhz
+
+
 def _add_generic_baars (src, a, b, c, fmin, fmax):
     def fluxdens (freq_mhz):
-        if np.any (freq_mhz < fmin) or np.any (freq_mhz > fmax):
-            raise PKError ('going beyond frequency limits of model: want '
-                           '%f, but validity is [%f, %f]', freq_mhz, fmin, fmax)
+        freq_mhz = _check_freq_limits (freq_mhz, fmin, fmax)
         lf = np.log10 (freq_mhz)
         return 10.**(a + b * lf + c * lf**2)
 
     def spindex (freq_mhz):
-        if np.any (freq_mhz < fmin) or np.any (freq_mhz > fmax):
-            raise PKError ('going beyond frequency limits of model: want '
-                           '%f, but validity is [%f, %f]', freq_mhz, fmin, fmax)
+        freq_mhz = _check_freq_limits (freq_mhz, fmin, fmax)
         return b + 2 * c * np.log10 (freq_mhz)
 
     models[src] = fluxdens
@@ -123,16 +159,12 @@ _init_generic_baars ()
 
 def _add_vla_model (src, a, b, c, d):
     def fluxdens (freq_mhz):
-        if np.any (freq_mhz < 300) or np.any (freq_mhz > 50000):
-            raise PKError ('going beyond frequency limits of model: want '
-                           '%f, but validity is [300, 50000]', freq_mhz)
+        freq_mhz = _check_freq_limits (freq_mhz, 300, 50000)
         lghz = np.log10 (freq_mhz) - 3
         return 10.**(a + b * lghz + c * lghz**2 + d * lghz**3)
 
     def spindex (freq_mhz):
-        if np.any (freq_mhz < 300) or np.any (freq_mhz > 50000):
-            raise PKError ('going beyond frequency limits of model: want '
-                           '%f, but validity is [300, 50000]', freq_mhz)
+        freq_mhz = _check_freq_limits (freq_mhz, 300, 50000)
         lghz = np.log10 (freq_mhz) - 3
         return b + 2 * c * lghz + 3 * d * lghz**2
 
@@ -182,7 +214,7 @@ def add_from_vla_obs (src, Lband, Cband):
         return 10. ** (A * np.log10 (freq_mhz) + B)
 
     def spindex (freq_mhz):
-        return A
+        return A + np.zeros_like (np.log10 (freq_mhz))
 
     models[src] = fluxdens
     spindexes[src] = spindex
@@ -191,14 +223,180 @@ def add_from_vla_obs (src, Lband, Cband):
 add_from_vla_obs ('3c84', 23.9, 23.3)
 
 
+def batch_fluxdens (sources, freq_mhz, year=None, spindex=False):
+    """Compute the flux densities of many calibrators at many frequencies.
+
+    sources
+      An array of source names, as used as keys in :data:`models`; "CasA" is
+      always accepted.
+    freq_mhz
+      An array of observing frequencies in MHz.
+    year
+      An array of the decimal years of the observations. Only needed if
+      *sources* includes "CasA"; the values for other sources are ignored.
+    spindex
+      If true, also compute the spectral indices.
+
+    Returns: an array of flux densities in Jy, or a tuple of that and an
+    array of spectral indices if *spindex* is true.
+
+    The arguments are broadcast against each other. All of the entries for
+    each source are evaluated in one vectorized call, so this is much faster
+    than calling the models once per entry. Errors from the models (e.g.,
+    going beyond their frequency limits) are raised as :exc:`PKError`.
+
+    """
+    if year is None:
+        sources, freq_mhz = np.broadcast_arrays (np.asarray (sources), freq_mhz)
+        year = np.full (freq_mhz.shape, np.nan)
+    else:
+        sources, freq_mhz, year = np.broadcast_arrays (np.asarray (sources),
+                                                       freq_mhz, year)
+
+    freq_mhz = freq_mhz.astype (float)
+    year = year.astype (float)
+    flux = np.empty (freq_mhz.shape)
+    sidx = np.empty (freq_mhz.shape)
+    usources, inverse = np.unique (sources, return_inverse=True)
+    inverse = inverse.reshape (freq_mhz.shape)
+
+    for i, source in enumerate (usources):
+        w = (inverse == i)
+        f = freq_mhz[w]
+
+        if source == 'CasA':
+            if np.any (~np.isfinite (year[w])):
+                raise PKError ('must specify the year when modeling Cas A')
+            flux[w] = cas_a (f, year[w])
+            if spindex:
+                sidx[w] = _cas_a_spindex (f, year[w])
+            continue
+
+        if source not in models:
+            raise PKError ('unknown source "%s"; known sources are: CasA, %s', source,
+                           ', '.join (sorted (k for k in models.keys () if k != 'CasA')))
+
+        flux[w] = models[source] (f)
+        if spindex:
+            sidx[w] = spindexes[source] (f)
+
+    if spindex:
+        return flux, sidx
+    return flux
+
+
 # If we're executed as a program, print out a flux given a source name.
 
+def _batch_rows (stream, blocksize=4096):
+    """Read calibrator rows for the batch mode of :func:`commandline`, yielding
+    lists of at most *blocksize* (lineno, line, words) tuples.
+
+    """
+    block = []
+
+    for lineno, line in enumerate (stream):
+        a = line.split ()
+        if not len (a) or a[0].startswith ('#'):
+            continue
+
+        block.append ((lineno + 1, line.rstrip (), a))
+
+        if len (block) >= blocksize:
+            yield block
+            block = []
+
+    if len (block):
+        yield block
+
+
+def _batch_eval_row (words, flux_mode):
+    """Evaluate one row in the batch mode of :func:`commandline`. Returns
+    (flux, freq_mhz, spindex). Raises an exception if the row is bad.
+
+    """
+    if len (words) not in (2, 3):
+        raise PKError ('expected "<source> <freq[mhz]> [<year>]"')
+
+    freq = float (words[1])
+    year = float (words[2]) if len (words) == 3 else np.nan
+    result = batch_fluxdens ([words[0]], [freq], [year], spindex=flux_mode)
+
+    if flux_mode:
+        return result[0][0], freq, result[1][0]
+    return result[0], freq, np.nan
+
+
+def _batch_commandline (argv, flux_mode):
+    from . import cli
+    import sys
+
+    if len (argv) > 2:
+        cli.wrong_usage (__doc__, 'must give at most one argument in batch mode')
+
+    if len (argv) == 1 or argv[1] == '-':
+        stream = sys.stdin
+    else:
+        try:
+            stream = open (argv[1])
+        except Exception as e:
+            cli.die ('unable to open "%s": %s', argv[1], e)
+
+    nbad = 0
+
+    for block in _batch_rows (stream):
+        # Fast path: evaluate the whole block at once. If anything's wrong
+        # with it, redo it row-by-row so that we can report the bad rows and
+        # keep going.
+
+        try:
+            words = [a for _, _, a in block]
+            if any (len (a) not in (2, 3) for a in words):
+                raise PKError ('malformed row')
+
+            sources = [a[0] for a in words]
+            freqs = np.array ([a[1] for a in words], dtype=float)
+            years = np.array ([a[2] if len (a) == 3 else 'nan' for a in words],
+                              dtype=float)
+            result = batch_fluxdens (sources, freqs, years, spindex=flux_mode)
+
+            if flux_mode:
+                rows = zip (result[0], freqs, result[1])
+            else:
+                rows = zip (result, freqs, freqs)
+        except Exception:
+            rows = []
+
+            for lineno, line, a in block:
+                try:
+                    rows.append (_batch_eval_row (a, flux_mode))
+                except Exception as e:
+                    cli.warn ('line %d ("%s"): %s', lineno, line, e)
+                    rows.append ((np.nan, np.nan, np.nan))
+                    nbad += 1
+
+        if flux_mode:
+            lines = ['%g,%g,%g' % (f, nu * 1e-3, si) for f, nu, si in rows]
+        else:
+            lines = ['%g' % f for f, _, _ in rows]
+
+        print ('\n'.join (lines))
+
+    if nbad:
+        cli.warn ('%d rows could not be evaluated; their results are "nan"', nbad)
+        return 1
+    return 0
+
+
 def commandline (argv):
     from . import cli
 
     cli.unicode_stdio ()
     cli.check_usage (__doc__, argv, usageifnoargs='long')
     flux_mode = cli.pop_option ('f', argv)
+
+    if cli.pop_option ('batch', argv):
+        return _batch_commandline (argv, flux_mode)
+
     source = argv[1]
 
     if source == 'CasA':
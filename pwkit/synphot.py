@@ -71,6 +71,11 @@ half-maximum points (in the EE convention) to define the band edges.
 This module requires Scipy and Pandas. It doesn't reeeeallllly need Pandas but
 it's convenient.
 
+The bundled text-format bandpass tables are also stored in a binary cache
+file that is much faster to load. After modifying the tables, regenerate the
+cache with ``python -m pwkit.synphot regen-cache``; ``python -m pwkit.synphot
+check-cache`` verifies that it is consistent with the text files.
+
 References
 ----------
 
@@ -86,21 +91,109 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 __all__ = str ('''AlreadyDefinedError Bandpass NotDefinedError Registry
                   builtin_registrars get_std_registry''').split ()
 
-import numpy as np, pandas as pd, pkg_resources
+import numpy as np
+
+from . import Holder, PKError, cgs
 
-from . import Holder, PKError, cgs, msmt
 
+# Data loading. The text-format bandpass tables are also stored in a single
+# binary file that's much faster to load. It must be regenerated whenever the
+# tables change; see `regenerate_bandpass_cache` and `check_bandpass_cache`.
 
-# Data loading
+_bandpass_cache_name = 'bandpasses.npz'
+_bandpass_cache = None
 
 def bandpass_data_stream (name):
+    import pkg_resources
     return pkg_resources.resource_stream ('pwkit', 'data/bandpasses/' + name)
 
+def _bandpass_text_names ():
+    import pkg_resources
+    return sorted (n for n in pkg_resources.resource_listdir ('pwkit', 'data/bandpasses')
+                   if n.endswith ('.dat'))
+
+def _load_bandpass_cache ():
+    global _bandpass_cache
+
+    if _bandpass_cache is None:
+        # All of the tables are stored in one flat array, since reading each
+        # member of an npz file has a fair amount of overhead.
+        try:
+            with np.load (bandpass_data_stream (_bandpass_cache_name)) as npz:
+                names, shapes, data = npz['names'], npz['shapes'], npz['data']
+        except IOError:
+            _bandpass_cache = {}
+        else:
+            ends = np.cumsum (shapes[:,0] * shapes[:,1])
+            _bandpass_cache = dict ((str (n), a.reshape (shape)) for n, a, shape
+                                    in zip (names, np.split (data, ends[:-1]), shapes))
+
+    return _bandpass_cache
+
+def bandpass_data_array (name):
+    """Load the 2D array of the text-format bandpass table *name*, using the
+    binary cache if possible. The result is a ``(nrows, ncols)`` array, as
+    with :func:`numpy.loadtxt`.
+
+    """
+    a = _load_bandpass_cache ().get (name)
+    if a is None:
+        a = np.loadtxt (bandpass_data_stream (name))
+    return a.copy ()
+
 def bandpass_data_frame (name, colnames):
-    a = np.loadtxt (bandpass_data_stream (name)).T
+    import pandas as pd
+    a = bandpass_data_array (name).T
     mapped = dict ((c, a[i]) for i, c in enumerate (colnames.split ()))
     return pd.DataFrame (mapped)
 
+def regenerate_bandpass_cache ():
+    """Regenerate the binary cache of the bandpass tables from the text-format
+    files. The cache is written into the package data directory, so this must
+    be run in a writeable (e.g., development) tree. Returns the path of the
+    file that was written.
+
+    """
+    import pkg_resources
+    global _bandpass_cache
+
+    names = _bandpass_text_names ()
+    arrays = [np.atleast_2d (np.loadtxt (bandpass_data_stream (n))) for n in names]
+    path = pkg_resources.resource_filename ('pwkit', 'data/bandpasses/' +
+                                            _bandpass_cache_name)
+
+    with open (path, 'wb') as f:
+        np.savez (f, names=np.array (names),
+                  shapes=np.array ([a.shape for a in arrays]),
+                  data=np.concatenate ([a.ravel () for a in arrays]))
+
+    _bandpass_cache = None
+    return path
+
+def check_bandpass_cache ():
+    """Check that the binary cache of the bandpass tables matches the
+    text-format files. Returns a list of strings describing any problems; an
+    empty list means that everything is consistent.
+
+    """
+    cache = _load_bandpass_cache ()
+    names = _bandpass_text_names ()
+    problems = []
+
+    if not cache:
+        return ['the bandpass cache file %s is missing or empty' % _bandpass_cache_name]
+
+    for n in names:
+        if n not in cache:
+            problems.append ('%s is missing from the cache' % n)
+        elif not np.array_equal (cache[n], np.loadtxt (bandpass_data_stream (n))):
+            problems.append ('%s does not match its cached version' % n)
+
+    for n in sorted (frozenset (cache) - frozenset (names)):
+        problems.append ('the cache contains %s, which has no text source' % n)
+
+    return problems
+
 def bandpass_data_fits (name):
     from astropy.io.fits import open
     return open (bandpass_data_stream (name))
@@ -212,6 +305,68 @@ def interpolated_halfmax_points (x, y):
     return x1, x2
 
 
+def _synphot_weights (bwlen, bresp, wlen):
+    """Compute the weights needed to do synthetic photometry exactly for
+    spectra sampled at the wavelengths *wlen*, through a bandpass with EE
+    response *bresp* sampled at wavelengths *bwlen*. *wlen* must be sorted
+    increasingly.
+
+    Returns ``(weights, denom)``. For a spectrum `flam` sampled at `wlen`, the
+    synthetic photometry is ``np.dot (weights, flam) / denom``, where both the
+    spectrum and the bandpass response are linearly interpolated between
+    their samples and taken to be zero outside of them.
+
+    Both curves are piecewise linear, so on the union of their wavelength
+    grids their product is piecewise quadratic and may be integrated exactly.
+    The integral is linear in `flam`, so we can express it as a weighted sum
+    of the spectrum samples.
+
+    """
+    bwlen = np.asarray (bwlen, dtype=float)
+    bresp = np.asarray (bresp, dtype=float)
+    wlen = np.asarray (wlen, dtype=float)
+    n = wlen.size
+
+    if n < 2:
+        raise ValueError ('need at least two spectral samples')
+
+    if np.any (bwlen[1:] < bwlen[:-1]):
+        # Some of the bandpass tables aren't quite sorted.
+        s = np.argsort (bwlen, kind='mergesort')
+        bwlen = bwlen[s]
+        bresp = bresp[s]
+
+    # The merged grid. We don't remove duplicates, which just yield
+    # zero-width intervals, so that steps in the bandpass response are
+    # preserved.
+    bmin, bmax = bwlen[0], bwlen[-1]
+    extra = wlen[(wlen > bmin) & (wlen < bmax)]
+    s = np.argsort (np.concatenate ((bwlen, extra)), kind='mergesort')
+    u = np.concatenate ((bwlen, extra))[s]
+    r = np.concatenate ((bresp, np.interp (extra, bwlen, bresp)))[s]
+
+    # Linear interpolation of the spectrum onto the merged grid, expressed as
+    # (1 - frac) * flam[idx] + frac * flam[idx+1].
+    idx = np.clip (np.searchsorted (wlen, u, 'right') - 1, 0, n - 2)
+    frac = (u - wlen[idx]) / (wlen[idx+1] - wlen[idx])
+
+    # For each interval, the exact integral of the product of two linear
+    # functions is h / 6 * (2 r0 f0 + r0 f1 + r1 f0 + 2 r1 f1). The spectrum
+    # is zero outside of its sampled range, and we know each interval to be
+    # either entirely inside or entirely outside of it.
+    h = np.diff (u)
+    mid = 0.5 * (u[1:] + u[:-1])
+    h = np.where ((mid >= wlen[0]) & (mid <= wlen[-1]), h / 6, 0.)
+    c = np.zeros (u.size)
+    c[:-1] += h * (2 * r[:-1] + r[1:])
+    c[1:] += h * (r[:-1] + 2 * r[1:])
+
+    weights = (np.bincount (idx, c * (1 - frac), minlength=n) +
+               np.bincount (idx + 1, c * frac, minlength=n))
+    denom = np.dot (np.diff (bwlen), 0.5 * (bresp[1:] + bresp[:-1]))
+    return weights, denom
+
+
 
 # Organized storage of the bandpass info. This way we're extensible (ooh aah)
 # and we don't have to run a bunch of code on module import.
@@ -355,11 +510,17 @@ class Bandpass (object):
         return fnu_cgs_to_flam_ang (cgs.cgsperjy * jy, self.pivot_wavelength ())
 
 
-    def synphot (self, wlen, flam):
+    def synphot (self, wlen, flam, method='exact'):
         """`wlen` and `flam` give a tabulated model spectrum in wavelength and f_λ
         units. We interpolate linearly over both the model and the bandpass
         since they're both discretely sampled.
 
+        If `method` is "exact", the default, the integral of the product of
+        the two interpolants is computed exactly on the merged wavelength
+        grid. If it is "romberg", the interpolants are integrated numerically
+        with :func:`scipy.integrate.romberg`, which is much slower; this was
+        the original implementation.
+
         Note that quadratic interpolation is both much slower and can blow up
         fatally in some cases. The latter issue might have to do with really large
         X values that aren't zero-centered, maybe?
@@ -369,11 +530,26 @@ class Bandpass (object):
         about what's going on under the hood.
 
         """
+        d = self._ensure_data ()
+
+        if method == 'exact':
+            wlen = np.asarray (wlen, dtype=float)
+            flam = np.asarray (flam, dtype=float)
+
+            if np.any (wlen[1:] < wlen[:-1]):
+                s = np.argsort (wlen, kind='mergesort')
+                wlen = wlen[s]
+                flam = flam[s]
+
+            weights, denom = _synphot_weights (d.wlen.values, d.resp.values, wlen)
+            return np.dot (weights, flam) / denom
+
+        if method != 'romberg':
+            raise ValueError ('unrecognized synphot method %r' % (method,))
+
         from scipy.interpolate import interp1d
         from scipy.integrate import romberg
 
-        d = self._ensure_data ()
-
         mflam = interp1d (wlen, flam,
                           kind='linear',
                           bounds_error=False, fill_value=0)
@@ -401,7 +577,9 @@ class Registry (object):
     get                       - Get a Bandpass object for a known telescope and filter.
     register_bpass            - Register a Bandpass class.
     register_halfmaxes        - Register precomputed half-max points.
+    register_lazy             - Register a function to be called when a telescope is first used.
     register_pivot_wavelength - Register precomputed pivot wavelengths.
+    synphot_grid              - Compute synthetic photometry for many spectra and bands.
     telescopes                - Return a list of telescopes known to this registry.
 
     """
@@ -410,6 +588,21 @@ class Registry (object):
         self._halfmaxes = {}
         self._bpass_classes = {}
         self._seen_bands = {}
+        self._lazy_registrars = {}
+
+
+    def _realize (self, telescope):
+        """If information about *telescope* is to be registered lazily, do so
+        now.
+
+        """
+        func = self._lazy_registrars.get (telescope)
+        if func is None:
+            return
+
+        for t in [t for t, f in self._lazy_registrars.items () if f is func]:
+            del self._lazy_registrars[t]
+        func (self)
 
 
     def _note (self, telescope, band):
@@ -420,11 +613,12 @@ class Registry (object):
 
     def telescopes (self):
         """Return a list of telescopes known to this registry."""
-        return self._seen_bands.keys ()
+        return list (frozenset (self._seen_bands) | frozenset (self._lazy_registrars))
 
 
     def bands (self, telescope):
         """Return a list of bands associated with the specified telescope."""
+        self._realize (telescope)
         q = self._seen_bands.get (telescope)
         if q is None:
             return []
@@ -432,6 +626,7 @@ class Registry (object):
 
 
     def register_pivot_wavelength (self, telescope, band, wlen):
+        self._realize (telescope)
         if (telescope, band) in self._pivot_wavelengths:
             raise AlreadyDefinedError ('pivot wavelength for %s/%s already '
                                        'defined', telescope, band)
@@ -441,6 +636,7 @@ class Registry (object):
 
 
     def register_halfmaxes (self, telescope, band, lower, upper):
+        self._realize (telescope)
         if (telescope, band) in self._halfmaxes:
             raise AlreadyDefinedError ('half-max points for %s/%s already '
                                        'defined', telescope, band)
@@ -450,6 +646,7 @@ class Registry (object):
 
 
     def register_bpass (self, telescope, klass):
+        self._realize (telescope)
         if telescope in self._bpass_classes:
             raise AlreadyDefinedError ('bandpass class for %s already '
                                        'defined', telescope)
@@ -458,7 +655,24 @@ class Registry (object):
         return self
 
 
+    def register_lazy (self, telescopes, func):
+        """Arrange for ``func (self)`` to be called the first time that
+        information about any of the named *telescopes* is needed. *func*
+        should register the information about all of them.
+
+        """
+        for t in telescopes:
+            if t in self._seen_bands or t in self._lazy_registrars:
+                raise AlreadyDefinedError ('information for %s already '
+                                           'defined', t)
+
+        for t in telescopes:
+            self._lazy_registrars[t] = func
+        return self
+
+
     def get (self, telescope, band):
+        self._realize (telescope)
         klass = self._bpass_classes.get (telescope)
         if klass is None:
             raise NotDefinedError ('bandpass data for %s not defined', telescope)
@@ -470,18 +684,100 @@ class Registry (object):
         return bp
 
 
+    def synphot_grid (self, wlen, flam, bands, chunksize=None, parallel=True):
+        """Compute synthetic photometry for many spectra through many bandpasses.
+
+        wlen
+          A 1D array of the wavelengths at which all of the spectra are
+          sampled, in Ångström.
+        flam
+          An array of spectra in f_λ units, of shape ``(..., wlen.size)``.
+        bands
+          An iterable of ``(telescope, band)`` tuples identifying the
+          bandpasses to use.
+        chunksize
+          (Optional) If provided, the spectra are split into chunks of about
+          this many that are processed with :meth:`ParallelHelper.get_ppmap`.
+        parallel
+          Controls parallelization of the chunks; default uses all available
+          cores. See :func:`pwkit.parallel.make_parallel_helper`. Has no
+          effect if *chunksize* is None.
+
+        Returns: an array of shape ``flam.shape[:-1] + (nbands,)``, with each
+        value being the result of the "exact" method of
+        :meth:`Bandpass.synphot` for the corresponding spectrum and band.
+
+        The integration weights of each band are computed once for the
+        shared wavelength grid, so that all of the photometry is evaluated
+        with a single matrix product.
+
+        """
+        wlen = np.asarray (wlen, dtype=float)
+        flam = np.asarray (flam, dtype=float)
+        bands = list (bands)
+
+        if wlen.ndim != 1:
+            raise ValueError ('wlen must be 1D')
+        if flam.ndim < 1 or flam.shape[-1] != wlen.size:
+            raise ValueError ('last axis of flam must be the same size as wlen')
+
+        outshape = flam.shape[:-1] + (len (bands),)
+        flam = flam.reshape ((-1, wlen.size))
+
+        if np.any (wlen[1:] < wlen[:-1]):
+            s = np.argsort (wlen, kind='mergesort')
+            wlen = wlen[s]
+            flam = flam[:,s]
+
+        weights = np.empty ((wlen.size, len (bands)))
+
+        for i, (telescope, band) in enumerate (bands):
+            d = self.get (telescope, band)._ensure_data ()
+            w, denom = _synphot_weights (d.wlen.values, d.resp.values, wlen)
+            weights[:,i] = w / denom
+
+        n = flam.shape[0]
+
+        if chunksize is None or n <= chunksize:
+            result = np.dot (flam, weights)
+        else:
+            from .parallel import make_parallel_helper
+            phelp = make_parallel_helper (parallel)
+            bounds = [(i, min (i + chunksize, n)) for i in range (0, n, chunksize)]
+
+            with phelp.get_ppmap () as ppmap:
+                result = np.concatenate (ppmap (_synphot_grid_ppmap_helper,
+                                                (flam, weights), bounds))
+
+        return result.reshape (outshape)
+
+
+def _synphot_grid_ppmap_helper (i, fixed_arg, bounds):
+    flam, weights = fixed_arg
+    return np.dot (flam[slice (*bounds)], weights)
+
+
 builtin_registrars = {}
 
+# The telescopes registered by each of the builtin registrars, so that the
+# registrars need only be run when one of their telescopes is used.
+_builtin_telescopes = {}
+
 
 def get_std_registry ():
     """Get a Registry object pre-filled with information for standard
-    telescopes.
+    telescopes. The information for each telescope is only actually
+    registered when it is first needed.
 
     """
-    from six import itervalues
+    from six import iteritems
     reg = Registry ()
-    for fn in itervalues (builtin_registrars):
-        fn (reg)
+    for key, fn in iteritems (builtin_registrars):
+        telescopes = _builtin_telescopes.get (key)
+        if telescopes is None:
+            fn (reg)
+        else:
+            reg.register_lazy (telescopes, fn)
     return reg
 
 
@@ -496,16 +792,26 @@ class TwomassBandpass (Bandpass):
         df.wlen *= 1e4 # micron to Angstrom
         return df
 
-    _zeropoints = {
+    _zeropoint_params = {
         # 2MASS Explanatory Supplement (VI.4.a) and Cohen+ 2003.
         # I've converted W/cm²/μm to erg/s/cm²/Å (factor of 1e3).
-        'J': msmt.Uval.from_norm (3.129e-10, 5.464e-12),
-        'H': msmt.Uval.from_norm (1.133e-10, 2.212e-12),
-        'Ks': msmt.Uval.from_norm (4.283e-11, 8.053e-13),
+        # Values are (mean, stddev).
+        'J': (3.129e-10, 5.464e-12),
+        'H': (1.133e-10, 2.212e-12),
+        'Ks': (4.283e-11, 8.053e-13),
     }
 
+    # Uvals made from the above, created on demand since doing so involves
+    # drawing random samples.
+    _zeropoints = {}
+
     def mag_to_flam (self, mag):
-        return self._zeropoints[self.band] * 10**(-0.4 * mag)
+        zp = self._zeropoints.get (self.band)
+        if zp is None:
+            from .msmt import Uval
+            zp = Uval.from_norm (*self._zeropoint_params[self.band])
+            self._zeropoints[self.band] = zp
+        return zp * 10**(-0.4 * mag)
 
 
 def register_2mass (reg):
@@ -522,6 +828,7 @@ def register_2mass (reg):
     reg.register_halfmaxes ('2MASS', 'Ks', 20242., 23026.)
 
 builtin_registrars['2MASS'] = register_2mass
+_builtin_telescopes['2MASS'] = ('2MASS',)
 
 
 # Standard Bessell filters reproducing the Johnson/Cousins UBVRI photometric
@@ -580,6 +887,7 @@ def register_bessell (reg):
     reg.register_halfmaxes ('Bessell', 'I', 7283., 8826.)
 
 builtin_registrars['Bessell'] = register_bessell
+_builtin_telescopes['Bessell'] = ('Bessell',)
 
 
 # GALEX
@@ -614,6 +922,7 @@ def register_galex (reg):
     reg.register_halfmaxes ('GALEX', 'fuv', 1415., 1646.)
 
 builtin_registrars['GALEX'] = register_galex
+_builtin_telescopes['GALEX'] = ('GALEX',)
 
 
 # LMIRCam on the LBT.
@@ -652,6 +961,7 @@ def register_lbt (reg):
     reg.register_halfmaxes ('LBT/LMIRCam', 'L', 34142., 39947.)
 
 builtin_registrars['LBT'] = register_lbt
+_builtin_telescopes['LBT'] = ('LBT/LMIRCam',)
 
 
 # MEarth. No absolute flux calibration available.
@@ -687,6 +997,7 @@ def register_mearth (reg):
     reg.register_halfmaxes ('MEarth', 'ccd715', 7148., 9360.)
 
 builtin_registrars['MEarth'] = register_mearth
+_builtin_telescopes['MEarth'] = ('MEarth',)
 
 
 # The Mauna Kea Observatory (MKO) IR filter system.
@@ -744,6 +1055,7 @@ def register_mko (reg):
     reg.register_halfmaxes ('MKO', 'Lp', 34276., 41228.)
 
 builtin_registrars['MKO'] = register_mko
+_builtin_telescopes['MKO'] = ('MKO',)
 
 
 # Sloan Digital Sky Survey primed photometric system. We fake things a bit and
@@ -777,6 +1089,7 @@ class SdssBandpass (Bandpass):
         included; I use the former.
 
         """
+        import pandas as pd
         h = bandpass_data_fits ('sdss3_filter_responses.fits')
         section = 'ugriz'.index (band[0]) + 1
         d = h[section].data
@@ -830,6 +1143,7 @@ def register_sdss (reg):
     reg.register_halfmaxes ('SDSS', 'zp', 8291., 9290.)
 
 builtin_registrars['SDSS'] = register_sdss
+_builtin_telescopes['SDSS'] = ('SDSS',)
 
 
 # Swift.
@@ -847,6 +1161,7 @@ class SwiftUvotBandpass (Bandpass):
         quantum-efficiency.
 
         """
+        import pandas as pd
         d = bandpass_data_fits ('sw' + self._band_map[band] + '_20041120v106.arf')[1].data
 
         # note:
@@ -867,6 +1182,7 @@ def register_swift (reg):
     reg.register_halfmaxes ('Swift/UVOT', 'UVW1', 2278., 2931.)
 
 builtin_registrars['Swift'] = register_swift
+_builtin_telescopes['Swift'] = ('Swift/UVOT',)
 
 
 # WISE
@@ -884,7 +1200,7 @@ class WiseBandpass (Bandpass):
         4: (1640, 2550),
     }
 
-    def _load_data (band):
+    def _load_data (self, band):
         """From the WISE All-Sky Explanatory Supplement, IV.4.h.i.1, and Jarrett+
         2011. These are relative response per erg and so can be integrated
         directly against F_nu spectra. Wavelengths are in micron,
@@ -928,3 +1244,48 @@ def register_wise (reg):
     reg.register_halfmaxes ('WISE', 4, 198530., 245927.)
 
 builtin_registrars['WISE'] = register_wise
+_builtin_telescopes['WISE'] = ('WISE',)
+
+
+# Command-line maintenance of the bandpass cache.
+
+_commandline_usage = """python -m pwkit.synphot <command>
+
+Maintain the binary cache of the bundled bandpass tables. Commands are:
+
+regen-cache
+  Regenerate the cache from the text-format tables.
+check-cache
+  Check that the cache matches the text-format tables. Exits with an error
+  code if it doesn't.
+"""
+
+def commandline (argv):
+    from . import cli
+
+    cli.unicode_stdio ()
+    cli.check_usage (_commandline_usage, argv, usageifnoargs=True)
+
+    if len (argv) != 2:
+        cli.wrong_usage (_commandline_usage, 'expect exactly one argument')
+
+    if argv[1] == 'regen-cache':
+        print ('wrote', regenerate_bandpass_cache ())
+        return 0
+
+    if argv[1] == 'check-cache':
+        problems = check_bandpass_cache ()
+        for p in problems:
+            print ('error:', p)
+        if problems:
+            return 1
+        print ('bandpass cache is consistent with %d text files'
+               % len (_bandpass_text_names ()))
+        return 0
+
+    cli.wrong_usage (_commandline_usage, 'unrecognized command "%s"', argv[1])
+
+
+if __name__ == '__main__':
+    from sys import argv, exit
+    exit (commandline (argv))
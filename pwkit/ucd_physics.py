@@ -15,8 +15,12 @@ bck_from_spt
   K-band bolometric correction from SpT.
 load_bcah98_mass_radius
   Load Baraffe+ 1998 mass/radius data.
+load_bcah98_table
+  Load the Baraffe+ 1998 data table.
 mass_from_j
   Mass from absolute J magnitude.
+mk_radius_from_mass_age_bcah98
+  Radius from mass and age, using BCAH98 models.
 mk_radius_from_mass_bcah98
   Radius from mass, using BCAH98 models.
 tauc_from_mass
@@ -25,8 +29,9 @@ tauc_from_mass
 """
 from __future__ import absolute_import, division, print_function, unicode_literals
 
-__all__ = str ('''bcj_from_spt bck_from_spt load_bcah98_mass_radius mass_from_j
-                  mk_radius_from_mass_bcah98 tauc_from_mass''').split ()
+__all__ = str ('''bcj_from_spt bck_from_spt load_bcah98_mass_radius load_bcah98_table
+                  mass_from_j mk_radius_from_mass_age_bcah98 mk_radius_from_mass_bcah98
+                  tauc_from_mass''').split ()
 
 # Implementation note: we use the numutil.broadcastize() decorator to be able
 # to handle both scalar and vector arguments semi-transparently. I'd also like
@@ -36,6 +41,7 @@ __all__ = str ('''bcj_from_spt bck_from_spt load_bcah98_mass_radius mass_from_j
 # what to do about this in general.
 
 import numpy as np
+from six import string_types
 
 from . import cgs, msmt, numutil
 
@@ -201,15 +207,84 @@ def mass_from_j (j_abs):
 
 # Radius estimation.
 
+# Parsed BCAH98 tables and interpolators made from them, for tables that were
+# loaded from files. The keys include the file modification times and sizes,
+# so that we notice if a file changes.
+_bcah98_tables = {}
+_bcah98_interps = {}
+
+
+def _bcah98_file_key (path):
+    import os
+    path = os.path.abspath (path)
+    st = os.stat (path)
+    return (path, st.st_mtime, st.st_size)
+
+
+def _parse_bcah98_table (tablelines):
+    a = np.loadtxt (tablelines, usecols=(0, 1, 2, 3, 4, 5, 7), ndmin=2).T
+    metallicity, heliumfrac, mixlength, mass, age, teff, mbol = a
+
+    # XXX to check: do they specify m_bol_sun = 4.64? IIRC, yes.
+    lbol = 10**(0.4 * (4.64 - mbol)) * cgs.lsun
+    area = lbol / (cgs.sigma * teff**4)
+    radius = np.sqrt (area / (4 * np.pi))
+
+    return np.rec.fromarrays ([metallicity, heliumfrac, mixlength, mass * cgs.msun,
+                               age, teff, radius],
+                              names=str ('metallicity,heliumfrac,mixlength,mass,age,teff,radius'))
+
+
+def load_bcah98_table (tablelines):
+    """Load the main data table for the famous models of Baraffe+
+    (1998A&A...337..403B).
+
+    tablelines
+      Either the path of the table data file, or an iterable yielding lines
+      from it. I've named the file '1998A&A...337..403B_tbl1-3.dat' in some
+      repositories (it's about 150K, not too bad). If this is a table
+      previously returned by this function, it is returned unchanged.
+
+    Returns: a Numpy record array with the fields `metallicity`,
+    `heliumfrac`, `mixlength`, `mass` (in g), `age` (in Gyr), `teff` (in K),
+    and `radius` (in cm, derived from the bolometric luminosity and Teff).
+
+    If a path is given, the parsed table is cached in memory, so that
+    subsequent calls with the same path are essentially free. The file is
+    reparsed if its modification time or size changes.
+
+    """
+    if isinstance (tablelines, np.ndarray):
+        return tablelines
+
+    if not isinstance (tablelines, string_types):
+        return _parse_bcah98_table (tablelines)
+
+    key = _bcah98_file_key (tablelines)
+    table = _bcah98_tables.get (key)
+
+    if table is None:
+        with open (tablelines, 'rb') as f:
+            table = _parse_bcah98_table (f)
+        _bcah98_tables[key] = table
+
+    return table
+
+
+def _select_bcah98 (table, metallicity, heliumfrac, mixlength=None):
+    w = (table.metallicity == metallicity) & (table.heliumfrac == heliumfrac)
+    if mixlength is not None:
+        w &= (table.mixlength == mixlength)
+    return table[w]
+
+
 def load_bcah98_mass_radius (tablelines, metallicity=0, heliumfrac=0.275,
                              age_gyr=5., age_tol=0.05):
     """Load mass and radius from the main data table for the famous models of
     Baraffe+ (1998A&A...337..403B).
 
     tablelines
-      An iterable yielding lines from the table data file.
-      I've named the file '1998A&A...337..403B_tbl1-3.dat'
-      in some repositories (it's about 150K, not too bad).
+      The table data; see :func:`load_bcah98_table`.
     metallicity
       The metallicity of the model to select.
     heliumfrac
@@ -226,46 +301,18 @@ def load_bcah98_mass_radius (tablelines, metallicity=0, heliumfrac=0.275,
     the age.
 
     """
-    mdata, rdata = [], []
+    t = _select_bcah98 (load_bcah98_table (tablelines), metallicity, heliumfrac)
+    t = t[np.abs (t.age - age_gyr) <= age_tol]
+    return t.mass.copy (), t.radius.copy ()
 
-    for line in tablelines:
-        a = line.strip ().split ()
 
-        thismetallicity = float (a[0])
-        if thismetallicity != metallicity:
-            continue
-
-        thisheliumfrac = float (a[1])
-        if thisheliumfrac != heliumfrac:
-            continue
-
-        thisage = float (a[4])
-        if abs (thisage - age_gyr) > age_tol:
-            continue
-
-        mass = float (a[3]) * cgs.msun
-        teff = float (a[5])
-        mbol = float (a[7])
-
-        # XXX to check: do they specify m_bol_sun = 4.64? IIRC, yes.
-        lbol = 10**(0.4 * (4.64 - mbol)) * cgs.lsun
-        area = lbol / (cgs.sigma * teff**4)
-        r = np.sqrt (area / (4 * np.pi))
-
-        mdata.append (mass)
-        rdata.append (r)
-
-    return np.asarray (mdata), np.asarray (rdata)
-
-
-def mk_radius_from_mass_bcah98 (*args, **kwargs):
+def mk_radius_from_mass_bcah98 (tablelines, metallicity=0, heliumfrac=0.275,
+                                age_gyr=5., age_tol=0.05):
     """Create a function that maps (sub)stellar mass to radius, based on the
     famous models of Baraffe+ (1998A&A...337..403B).
 
     tablelines
-      An iterable yielding lines from the table data file.
-      I've named the file '1998A&A...337..403B_tbl1-3.dat'
-      in some repositories (it's about 150K, not too bad).
+      The table data; see :func:`load_bcah98_table`.
     metallicity
       The metallicity of the model to select.
     heliumfrac
@@ -282,11 +329,24 @@ def mk_radius_from_mass_bcah98 (*args, **kwargs):
     fraction. Therefore, there needs to be a tolerance parameter for matching
     the age.
 
+    If *tablelines* is a path, the function is memoized, so that repeated
+    calls with the same arguments return the same function without
+    recomputing it.
+
     This function requires Scipy.
 
     """
+    key = None
+    if isinstance (tablelines, string_types):
+        key = ('1d', _bcah98_file_key (tablelines), metallicity, heliumfrac,
+               age_gyr, age_tol)
+        interp = _bcah98_interps.get (key)
+        if interp is not None:
+            return interp
+
     from scipy.interpolate import UnivariateSpline
-    m, r = load_bcah98_mass_radius (*args, **kwargs)
+    m, r = load_bcah98_mass_radius (tablelines, metallicity, heliumfrac,
+                                    age_gyr, age_tol)
     spl = UnivariateSpline (m, r, s=1)
 
     # This allows us to do range-checking with either scalars or vectors with
@@ -297,6 +357,80 @@ def mk_radius_from_mass_bcah98 (*args, **kwargs):
             raise ValueError ('mass_g must must be between 0.05 and 0.7 Msun')
         return spl (mass_g)
 
+    if key is not None:
+        _bcah98_interps[key] = interp
+    return interp
+
+
+def mk_radius_from_mass_age_bcah98 (tablelines, metallicity=0, heliumfrac=0.275,
+                                    mixlength=None):
+    """Create a function that maps (sub)stellar mass and age to radius, based on
+    the famous models of Baraffe+ (1998A&A...337..403B).
+
+    tablelines
+      The table data; see :func:`load_bcah98_table`.
+    metallicity
+      The metallicity of the models to select.
+    heliumfrac
+      The helium fraction of the models to select.
+    mixlength
+      If not None, the mixing length parameter of the models to select.
+
+    Returns: a function mator(mass_g, age_gyr), returning a radius in cm as a
+    function of a mass in grams and an age in Gyr. The arguments are
+    broadcast against each other, so that one call can handle a whole
+    population of objects with different masses and ages.
+
+    The models are evolutionary tracks at a set of masses. The radius is
+    interpolated linearly in log(age) along the tracks bracketing each mass,
+    then linearly in mass between them. Masses and ages outside of the
+    tracks yield NaN.
+
+    If *tablelines* is a path, the function is memoized, as with
+    :func:`mk_radius_from_mass_bcah98`.
+
+    """
+    key = None
+    if isinstance (tablelines, string_types):
+        key = ('2d', _bcah98_file_key (tablelines), metallicity, heliumfrac, mixlength)
+        interp = _bcah98_interps.get (key)
+        if interp is not None:
+            return interp
+
+    t = _select_bcah98 (load_bcah98_table (tablelines), metallicity, heliumfrac, mixlength)
+    masses = np.unique (t.mass)
+
+    if masses.size < 2:
+        raise ValueError ('need models at two or more masses')
+
+    tracks = []
+    for m in masses:
+        tt = t[t.mass == m]
+        s = np.argsort (tt.age, kind='mergesort')
+        tracks.append ((np.log10 (tt.age[s]), tt.radius[s]))
+
+    @numutil.broadcastize (2)
+    def interp (mass_g, age_gyr):
+        shape = mass_g.shape
+        mass_g = mass_g.ravel ()
+        with np.errstate (invalid='ignore', divide='ignore'):
+            lage = np.log10 (age_gyr.ravel ())
+
+        # The radius along each track at each of the requested ages ...
+        rtrack = np.empty ((masses.size, lage.size))
+        for i, (tlage, tradius) in enumerate (tracks):
+            rtrack[i] = np.interp (lage, tlage, tradius, left=np.nan, right=np.nan)
+
+        # ... interpolated between the tracks bracketing each mass.
+        j = np.clip (np.searchsorted (masses, mass_g, 'right') - 1, 0, masses.size - 2)
+        f = (mass_g - masses[j]) / (masses[j+1] - masses[j])
+        idx = np.arange (lage.size)
+        r = (1 - f) * rtrack[j,idx] + f * rtrack[j+1,idx]
+        r[(mass_g < masses[0]) | (mass_g > masses[-1]) | np.isnan (lage)] = np.nan
+        return r.reshape (shape)
+
+    if key is not None:
+        _bcah98_interps[key] = interp
     return interp
 
 